@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+##
+# @file buildManifest.py
+#
+# @brief This file keeps track of which outputs were produced from which inputs
+#
+# @section description Description
+# Each folder containing input files gets a manifest file, which maps each input file
+# to the hash of its contents, the hash of the settings it was built with and the
+# outputs it produced. Songs which did not change since the last build can be skipped,
+# and outputs of a previous build which are no longer produced get removed
+#
+# @section notes Notes
+# - Paths in the manifest are relative to the folder of the manifest
+# - Incremental builds can be turned off using the 'incrementalBuild' option or '--force'
+
+import hashlib
+import json
+import os
+import lib.config
+import logging
+
+MANIFEST_FILENAME = ".buildmanifest.json"
+MANIFEST_VERSION = 1
+# Options which change which outputs get produced
+EXPORT_OPTIONS = ['exporttoimg', 'exporttotxt', 'exporttoraw', 'exporttopdf', 'exporttosvg', 'transpose']
+# Output settings which contain paths to font files
+FONT_OPTIONS = ['metafontfamily', 'lyricfontfamily', 'tablaturefontfamliy']
+
+"""!@brief Returns the hash of the contents of a file
+    @param filePath path to the file
+    @return hex digest of the file contents
+"""
+def hashFile(filePath):
+  digest = hashlib.sha256()
+  with open(filePath, 'rb') as file:
+    for chunk in iter(lambda: file.read(1 << 16), b''):
+      digest.update(chunk)
+  return digest.hexdigest()
+
+"""!@brief Returns the hash of all settings which influence the outputs
+    This includes the [output] settings, the export options and the contents of the font files
+    @return hex digest of the settings
+"""
+def hashSettings():
+  digest = hashlib.sha256()
+  outputConfig = lib.config.config['output']
+  optionsConfig = lib.config.config['options']
+  for key in sorted(outputConfig):
+    digest.update("{}={}\n".format(key, outputConfig[key]).encode())
+  for key in EXPORT_OPTIONS:
+    digest.update("{}={}\n".format(key, optionsConfig[key]).encode())
+  for key in FONT_OPTIONS:
+    fontPath = outputConfig[key]
+    if os.path.isfile(fontPath):
+      digest.update(hashFile(fontPath).encode())
+  return digest.hexdigest()
+
+"""!@brief Class containing the build manifest of a single folder
+"""
+class Manifest:
+  def __init__(self, folder):
+    # Folder containing the input files and the manifest
+    self.folder = folder
+    self.path = os.path.join(folder, MANIFEST_FILENAME)
+    # input file name -> {'inputHash', 'settingsHash', 'outputs'}
+    self.entries = {}
+    self.isModified = False
+    self.load()
+
+  """!@brief Loads the manifest from disk, if there is a valid one
+    @return None
+  """
+  def load(self):
+    if not os.path.isfile(self.path):
+      return
+    try:
+      with open(self.path, 'r') as file:
+        data = json.load(file)
+    except (OSError, ValueError) as error:
+      logging.warning("Ignoring unreadable build manifest '{}': {}".format(self.path, error))
+      return
+    if data.get('version') != MANIFEST_VERSION:
+      logging.info("Ignoring build manifest '{}' since it has a different version".format(self.path))
+      return
+    self.entries = data.get('songs', {})
+
+  """!@brief Writes the manifest to disk if it changed
+    Writing is best effort: if the manifest can not be written, a warning is logged and it is written again on the next save
+    @return None
+  """
+  def save(self):
+    if not self.isModified:
+      return
+    # Write to a temporary file first, so that a crash never leaves a partially written manifest
+    temporaryPath = self.path + ".tmp"
+    try:
+      with open(temporaryPath, 'w') as file:
+        json.dump({'version': MANIFEST_VERSION, 'songs': self.entries}, file, indent=2, sort_keys=True)
+      os.replace(temporaryPath, self.path)
+    except OSError as error:
+      logging.warning("Could not write build manifest '{}': {}".format(self.path, error))
+      try:
+        os.remove(temporaryPath)
+      except OSError:
+        pass
+      return
+    self.isModified = False
+
+  """!@brief Checks whether the outputs of an input file are up to date
+    @param inputFile path to the input file
+    @param inputHash hash of the contents of the input file
+    @param settingsHash hash of the settings
+    @return True if the input did not change and all of its outputs still exist
+  """
+  def isUpToDate(self, inputFile, inputHash, settingsHash):
+    entry = self.entries.get(os.path.basename(inputFile))
+    if not entry:
+      return False
+    if entry['inputHash'] != inputHash or entry['settingsHash'] != settingsHash:
+      return False
+    return all(os.path.isfile(os.path.join(self.folder, output)) for output in entry['outputs'])
+
+  """!@brief Records the outputs of an input file and removes outputs of the previous build it no longer produces
+    @param inputFile path to the input file
+    @param inputHash hash of the contents of the input file
+    @param settingsHash hash of the settings
+    @param outputs list of paths to the files which were written
+    @return None
+  """
+  def record(self, inputFile, inputHash, settingsHash, outputs):
+    name = os.path.basename(inputFile)
+    outputs = sorted(os.path.relpath(output, self.folder) for output in outputs)
+    previous = self.entries.get(name)
+    if previous:
+      for staleOutput in set(previous['outputs']) - set(outputs):
+        stalePath = os.path.join(self.folder, staleOutput)
+        if os.path.isfile(stalePath):
+          logging.info("Removing stale output '{}'".format(stalePath))
+          os.remove(stalePath)
+    self.entries[name] = {'inputHash': inputHash, 'settingsHash': settingsHash, 'outputs': outputs}
+    self.isModified = True
+
+  """!@brief Forgets an input file, so that it gets rebuilt next time
+    @param inputFile path to the input file
+    @return None
+  """
+  def forget(self, inputFile):
+    if self.entries.pop(os.path.basename(inputFile), None) is not None:
+      self.isModified = True
+
+"""!@brief Class keeping track of the manifests of all input folders
+"""
+class BuildState:
+  def __init__(self):
+    self.settingsHash = hashSettings()
+    # folder -> Manifest
+    self.manifests = {}
+    # input file -> hash of its contents
+    self.inputHashes = {}
+
+  """!@brief Returns the manifest of the folder containing the input file
+    @param inputFile path to the input file
+    @return Manifest object
+  """
+  def getManifest(self, inputFile):
+    folder = os.path.dirname(inputFile) or '.'
+    if folder not in self.manifests:
+      self.manifests[folder] = Manifest(folder)
+    return self.manifests[folder]
+
+  """!@brief Checks whether a song needs to be built again
+    @param inputFile path to the input file
+    @return True if the input, settings or outputs changed since the last build
+  """
+  def needsBuild(self, inputFile):
+    self.inputHashes[inputFile] = hashFile(inputFile)
+    return not self.getManifest(inputFile).isUpToDate(inputFile, self.inputHashes[inputFile], self.settingsHash)
+
+  """!@brief Records the result of building a song
+    @param inputFile path to the input file
+    @param outputs list of paths to the files which were written, or None if the build failed
+    @return None
+  """
+  def record(self, inputFile, outputs):
+    manifest = self.getManifest(inputFile)
+    if outputs is None:
+      manifest.forget(inputFile)
+    else:
+      manifest.record(inputFile, self.inputHashes[inputFile], self.settingsHash, outputs)
+
+  """!@brief Writes all changed manifests to disk
+    @return None
+  """
+  def save(self):
+    for manifest in self.manifests.values():
+      manifest.save()
@@ -5,17 +5,334 @@
 # @brief This file returns tablature for chords in different positions and voicings
 #
 # @section description Description
-# -
+# For every root, chord quality and CAGED shape a fingering is generated, like so:
+#     B       x24442
+#     C#m     x46654
+#     Amaj7   x02120
+#     F#m     244222
+# Each shape puts the root on a fixed string, the lowest one sounding, and looks for the playable
+# fingering within a window of four frets which contains all notes of the chord
 #
-# @section notes Notes
-# - File might never be created in the first place, since we might create a lookup table using data from existing available API's
+# Searching for fingerings is slow, so all of them are generated once and stored in a table,
+# which is loaded the first time a chord is looked up. Looking up a chord is a single index into the table
+# The table is generated again with 'python3 -m lib.chordFinder'
+#
+# The table file consists of a header and the frets of all voicings:
+# - header: magic, format version and hash of the tuning, qualities and shapes it was generated for
+# - 6 frets per voicing, from the low to the high string, for each root, quality and shape in that order
 #
-# @section todo TODO
-# - we need to itemize all chords in the song and major/minor/diminshed/augmented/dom7/maj7/etc (we can support more voicings as we go)
-#       then for each chord, get location for each (C A G E D) shape
-#       for each shape, generate finger position tab, like so:
-#           B       x24442
-#           C#m     x46654
-#           Amaj7   x02120
-#           F#m     244222
-#           Am6     x04555
+# @section notes Notes
+# - Slash chords are looked up without their bass note
+# - If the 'chordAppendix' setting is set, the fingerings of all chords of a song are added after its last section
+
+import hashlib
+import itertools
+import os
+import struct
+import lib.config
+import lib.dataStructures
+import lib.transpose
+import logging
+
+VOICING_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "chordVoicings.bin")
+VOICING_TABLE_MAGIC = b"GSPV"
+# Increase whenever the search or the table format changes
+VOICING_TABLE_VERSION = 1
+# magic, version, hash of the generator input
+HEADER_FORMAT = struct.Struct("<4sI32s")
+
+# Note index of each open string in standard tuning, from the low to the high string
+TUNING = [lib.transpose.NOTE_INDEX[note] for note in ['E', 'A', 'D', 'G', 'B', 'E']]
+# Fret value of a string which is not played
+MUTED = 255
+# Fret value of all strings of a voicing which could not be generated
+NO_VOICING = 254
+# Amount of frets a hand can span
+WINDOW_SIZE = 4
+MAX_FINGERS = 4
+# Quality -> intervals in semitones from the root
+QUALITIES = {
+  '': (0, 4, 7),
+  'm': (0, 3, 7),
+  '5': (0, 7),
+  'dim': (0, 3, 6),
+  'aug': (0, 4, 8),
+  'sus2': (0, 2, 7),
+  'sus4': (0, 5, 7),
+  '6': (0, 4, 7, 9),
+  'm6': (0, 3, 7, 9),
+  '7': (0, 4, 7, 10),
+  'maj7': (0, 4, 7, 11),
+  'm7': (0, 3, 7, 10),
+  'mmaj7': (0, 3, 7, 11),
+  'dim7': (0, 3, 6, 9),
+  'm7b5': (0, 3, 6, 10),
+  '7sus4': (0, 5, 7, 10),
+  'add9': (0, 2, 4, 7),
+  '9': (0, 2, 4, 7, 10),
+}
+QUALITY_INDEX = {quality: index for index, quality in enumerate(QUALITIES)}
+# Other ways of writing a quality
+QUALITY_ALIASES = {'M': '', 'maj': '', 'min': 'm', '+': 'aug', 'sus': 'sus4', 'M7': 'maj7', 'min7': 'm7', 'min6': 'm6', 'dom7': '7'}
+# Shape -> (string of the root, first fret of the window relative to the root)
+SHAPES = {
+  'C': (1, 1 - WINDOW_SIZE),
+  'A': (1, 0),
+  'G': (0, 1 - WINDOW_SIZE),
+  'E': (0, 0),
+  'D': (2, 0),
+}
+STRING_AMOUNT = len(TUNING)
+ROOT_AMOUNT = len(lib.transpose.slider)
+VOICING_AMOUNT = ROOT_AMOUNT * len(QUALITIES) * len(SHAPES)
+
+"""!@brief Returns the hash of everything the voicings are generated from
+    @return digest of the generator input
+"""
+def hashGeneratorInput():
+  digest = hashlib.sha256()
+  digest.update("version={}\n".format(VOICING_TABLE_VERSION).encode())
+  digest.update("tuning={}\nwindow={}\nfingers={}\n".format(TUNING, WINDOW_SIZE, MAX_FINGERS).encode())
+  digest.update("qualities={}\nshapes={}\n".format(list(QUALITIES.items()), list(SHAPES.items())).encode())
+  return digest.digest()
+
+"""!@brief Counts the fingers needed to hold the frets of a voicing
+    Strings at the lowest fret are barred with a single finger, unless an open string lies between them
+    @param frets tuple of frets, MUTED for strings which are not played
+    @return amount of fingers
+"""
+def countFingers(frets):
+  fretted = [(string, fret) for string, fret in enumerate(frets) if fret != MUTED and fret > 0]
+  if not fretted:
+    return 0
+  lowestFret = min(fret for string, fret in fretted)
+  barredStrings = [string for string, fret in fretted if fret == lowestFret]
+  if len(barredStrings) > 1 and all(frets[string] != 0 for string in range(barredStrings[0], barredStrings[-1] + 1)):
+    return len(fretted) - len(barredStrings) + 1
+  return len(fretted)
+
+"""!@brief Searches the playable voicing of a chord using a CAGED shape
+    Strings below the root string are muted, only the highest strings may be muted as well
+    All notes of the chord are played, except for the fifth of chords with more notes than strings to spare
+    Of all voicings, the one with the most strings, fewest fingers and smallest stretch is picked
+    @param root note index of the root
+    @param intervals tuple of intervals in semitones from the root
+    @param shape name of the shape
+    @return tuple of frets from the low to the high string, MUTED for strings which are not played, or None
+"""
+def generateVoicing(root, intervals, shape):
+  rootString, windowOffset = SHAPES[shape]
+  rootFret = (root - TUNING[rootString]) % ROOT_AMOUNT
+  if rootFret + windowOffset < 0:
+    rootFret += ROOT_AMOUNT
+  firstFret = rootFret + windowOffset
+  window = range(firstFret, firstFret + WINDOW_SIZE)
+  tones = set((root + interval) % ROOT_AMOUNT for interval in intervals)
+  candidates = []
+  for string in range(rootString + 1, STRING_AMOUNT):
+    candidates.append([fret for fret in window if (TUNING[string] + fret) % ROOT_AMOUNT in tones] + [MUTED])
+  requiredTones = [tones]
+  if 7 in intervals:
+    requiredTones.append(tones - {(root + 7) % ROOT_AMOUNT})
+  for required in requiredTones:
+    best = None
+    bestScore = None
+    for upperFrets in itertools.product(*candidates):
+      sounding = [fret for fret in upperFrets if fret != MUTED]
+      # Muted strings must be above all played strings
+      if MUTED in upperFrets[:len(sounding)]:
+        continue
+      played = set((TUNING[string] + fret) % ROOT_AMOUNT for string, fret in zip(range(rootString + 1, STRING_AMOUNT), upperFrets) if fret != MUTED)
+      if not required <= played | {root}:
+        continue
+      frets = (MUTED,) * rootString + (rootFret,) + upperFrets
+      fingers = countFingers(frets)
+      if fingers > MAX_FINGERS:
+        continue
+      playedFrets = [fret for fret in frets if fret != MUTED]
+      score = (-len(playedFrets), fingers, max(playedFrets) - min(playedFrets), sum(playedFrets))
+      if bestScore is None or score < bestScore:
+        best, bestScore = frets, score
+    if best is not None:
+      return best
+  return None
+
+"""!@brief Generates the voicings of all roots, qualities and shapes
+    Searching all fingerings of each shape is far slower than looking them up, which is why the result is stored in a table file
+    @return bytes of the voicing table, without header
+"""
+def generateVoicingTable():
+  table = bytearray()
+  for root in range(ROOT_AMOUNT):
+    for intervals in QUALITIES.values():
+      for shape in SHAPES:
+        frets = generateVoicing(root, intervals, shape)
+        table += bytes(frets) if frets else bytes([NO_VOICING] * STRING_AMOUNT)
+  return bytes(table)
+
+"""!@brief Generates all voicings and writes them to a table file
+    @param tablePath path to the table file
+    @return None
+"""
+def saveVoicingTable(tablePath):
+  header = HEADER_FORMAT.pack(VOICING_TABLE_MAGIC, VOICING_TABLE_VERSION, hashGeneratorInput())
+  with open(tablePath, 'wb') as file:
+    file.write(header + generateVoicingTable())
+
+"""!@brief Reads the voicings from a table file
+    @param tablePath path to the table file
+    @return bytes of the voicing table, or None if the file is missing or does not match the generator
+"""
+def loadVoicingTable(tablePath):
+  try:
+    with open(tablePath, 'rb') as file:
+      data = file.read()
+    magic, version, generatorHash = HEADER_FORMAT.unpack_from(data, 0)
+  except FileNotFoundError:
+    return None
+  except (OSError, struct.error) as error:
+    logging.warning("Ignoring unreadable chord voicing table '%s': %s", tablePath, error)
+    return None
+  table = data[HEADER_FORMAT.size:]
+  if magic != VOICING_TABLE_MAGIC or version != VOICING_TABLE_VERSION or generatorHash != hashGeneratorInput():
+    return None
+  if len(table) != VOICING_AMOUNT * STRING_AMOUNT:
+    return None
+  return table
+
+# Voicing table of this process, loaded when the first chord is looked up
+voicingTable = None
+
+"""!@brief Returns the voicing table, loading it if needed
+    If the table file is out of date, the voicings are generated instead
+    @return bytes of the voicing table
+"""
+def getVoicingTable():
+  global voicingTable
+  if voicingTable is None:
+    voicingTable = loadVoicingTable(VOICING_TABLE_PATH)
+    if voicingTable is None:
+      logging.warning("Chord voicing table '%s' is missing or out of date, generating voicings instead. Run 'python3 -m lib.chordFinder' to update it", VOICING_TABLE_PATH)
+      voicingTable = generateVoicingTable()
+  return voicingTable
+
+"""!@brief Converts the frets of a voicing to tablature, like 'x02210'
+    Frets are separated by dashes if any of them has two digits, like 'x-10-12-12-12-10'
+    @param frets sequence of frets, MUTED for strings which are not played
+    @return tablature string
+"""
+def fretsToTablature(frets):
+  strings = ['x' if fret == MUTED else str(fret) for fret in frets]
+  if any(len(string) > 1 for string in strings):
+    return '-'.join(strings)
+  return ''.join(strings)
+
+"""!@brief Returns the root and quality of a chord as found in the voicing table
+    @param chord string of a single chord, like 'Am7' or 'D/F#'
+    @return tuple of (note index of the root, quality index), or None if the chord is not in the table
+"""
+def getChordIndex(chord):
+  parsedChord = lib.transpose.parseChord(chord)
+  if parsedChord is None:
+    return None
+  root, quality, bass = parsedChord
+  quality = QUALITY_ALIASES.get(quality, quality)
+  if quality not in QUALITY_INDEX:
+    return None
+  return lib.transpose.NOTE_INDEX[root], QUALITY_INDEX[quality]
+
+"""!@brief Returns the voicings of a chord in each CAGED shape
+    @param chord string of a single chord, like 'Am7' or 'D/F#'
+    @return list of (shape, tablature string), empty if the chord is unknown
+"""
+def getVoicings(chord):
+  chordIndex = getChordIndex(chord)
+  if chordIndex is None:
+    return []
+  table = getVoicingTable()
+  root, quality = chordIndex
+  offset = (root * len(QUALITIES) + quality) * len(SHAPES) * STRING_AMOUNT
+  voicings = []
+  for shape in SHAPES:
+    frets = table[offset:offset + STRING_AMOUNT]
+    offset += STRING_AMOUNT
+    if frets[0] != NO_VOICING:
+      voicings.append((shape, fretsToTablature(frets)))
+  return voicings
+
+"""!@brief Returns the voicing of a chord which is played closest to the nut
+    @param chord string of a single chord, like 'Am7' or 'D/F#'
+    @return tablature string, or None if the chord is unknown
+"""
+def getPreferredVoicing(chord):
+  chordIndex = getChordIndex(chord)
+  if chordIndex is None:
+    return None
+  table = getVoicingTable()
+  root, quality = chordIndex
+  offset = (root * len(QUALITIES) + quality) * len(SHAPES) * STRING_AMOUNT
+  best = None
+  bestPosition = None
+  for shapeOffset in range(offset, offset + len(SHAPES) * STRING_AMOUNT, STRING_AMOUNT):
+    frets = table[shapeOffset:shapeOffset + STRING_AMOUNT]
+    if frets[0] == NO_VOICING:
+      continue
+    position = max(fret for fret in frets if fret != MUTED)
+    if bestPosition is None or position < bestPosition:
+      best, bestPosition = frets, position
+  return fretsToTablature(best) if best else None
+
+"""!@brief Returns the preferred voicing of each distinct chord of a song
+    Slash chords are looked up without their bass note, so 'A/C#' is listed as 'A'
+    @param songObj parsed lib.dataStructures.Song object
+    @return list of (chord, tablature string) in order of appearance, leaving out unknown chords
+"""
+def getSongVoicings(songObj):
+  voicings = {}
+  for chord in lib.transpose.getSongChords(songObj):
+    chord = chord.split('/')[0]
+    if chord not in voicings:
+      voicing = getPreferredVoicing(chord)
+      if voicing:
+        voicings[chord] = voicing
+  return list(voicings.items())
+
+"""!@brief Creates a section listing the fingerings of all chords of a song
+    Chords are listed in tablature lines no wider than the widest tablature line of the song
+    @param songObj parsed lib.dataStructures.Song object
+    @return lib.dataStructures.Section object, or None if the song has no known chords
+"""
+def createChordAppendix(songObj):
+  voicings = getSongVoicings(songObj)
+  if not voicings:
+    return None
+  entries = ["{} {}".format(chord, voicing) for chord, voicing in voicings]
+  columnWidth = max(len(entry) for entry in entries) + 3
+  lineWidth = max((len(line.rstrip()) for section in songObj.sections for line in section.tablatures), default=0)
+  entriesPerLine = max(1, (lineWidth + 3) // columnWidth)
+  section = lib.dataStructures.Section()
+  section.header = "[Chords]\r\n"
+  for start in range(0, len(entries), entriesPerLine):
+    section.tablatures.append(''.join(entry.ljust(columnWidth) for entry in entries[start:start + entriesPerLine]).rstrip() + '\r\n')
+    section.lyrics.append('')
+  section.isParsed = True
+  return section
+
+"""!@brief Returns the song to lay out, with the chord appendix after its last section if enabled
+    @param songObj parsed lib.dataStructures.Song object
+    @return copy of the song including the appendix, or the song itself
+"""
+def addChordAppendix(songObj):
+  if lib.config.config['output']['chordappendix'] != '1':
+    return songObj
+  appendix = createChordAppendix(songObj)
+  if appendix is None:
+    return songObj
+  songWithAppendix = songObj.copy()
+  songWithAppendix.sections = songObj.sections + [appendix]
+  songWithAppendix.lineTable = None
+  return songWithAppendix
+
+if __name__ == "__main__":
+  saveVoicingTable(VOICING_TABLE_PATH)
+  print("Wrote {} voicings to '{}'".format(VOICING_AMOUNT, VOICING_TABLE_PATH))
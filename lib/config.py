@@ -16,6 +16,11 @@
 
 import os
 import configparser
+import logging
+
+# Log level for tracing every line, below logging.DEBUG so it can be turned off separately
+TRACE = 5
+logging.addLevelName(TRACE, 'TRACE')
 
 
 """!@brief Load, creates and keeps the config up to date
@@ -24,41 +29,76 @@ def initConfig():
   # Default config
   global config
   config = configparser.ConfigParser()
-  # If a config file exists, load it
+  # Load defaults first, so that settings missing from an older config file get added
+  config['input'] = {'inputFolders': os.getcwd(),
+      'maxDepth': 1,
+      'readtxt': 1,
+      'readraw': 1
+    }
+  config['options'] = {'exporttoimg': 1,
+      'exporttotxt': 0,
+      'exporttoraw': 0,
+      'exporttopdf': 0,
+      'exporttosvg': 0,
+      'combinedPdf': '',
+      'bulkTxt': '',
+      'bulkTxtRaw': 0,
+      'logLevel': 3,
+      'metricsCacheSize': 65536,
+      'fontPoolSize': 256,
+      'jobs': 1,
+      'incrementalBuild': 1,
+      'watchInterval': 1,
+      'watchDebounce': 0.5,
+      'useGlyphAtlas': 1,
+      'glyphAtlasSize': 8192,
+      'pageRenderThreads': 1,
+      'cacheLayoutPlans': 1,
+      'cacheParsedSongs': 1,
+      'songIndex': '',
+      'transpose': '0'
+    }
+  config['output'] = {'metafontfamily': 'fonts/CourierPrime-Regular.ttf',
+      'metaFontWeight': 32,
+      'lyricfontfamily': 'fonts/CourierPrime-Regular.ttf',
+      'tablaturefontfamliy': 'fonts/CourierPrime-Bold.ttf',
+      'imageppi': 144,
+      'backgroundColour': '255,255,255',
+      'fontColour': '0,0,0',
+      'metadataColour': '128,128,128',
+      'verticalMargin': 50,
+      'horizontalMargin': 100,
+      'extraHorizontalMargin': 100,
+      'tryToShrinkRatio' : 0.4,
+      'shortestlinewhitespaceratioallowed': 0.95,
+      'longestlinewhitespaceratioallowed': 0.30,
+      'keepEmptyLines': 1,
+      'writeheaderfile': 0,
+      'minPages': 2,
+      'maxPages': 4,
+      'preferEvenPageNumbers': 0,
+      'monospaceLayout': 0,
+      'pngCompressLevel': 6,
+      'colourMode': 'auto',
+      'ditherMetadata': 1,
+      'pdfEmbedFonts': 1,
+      'svgEmbedFonts': 0,
+      'chordSpelling': 'auto',
+      'chordAppendix': 0
+    }
+  # If a config file exists, load it on top of the defaults
   if os.path.isfile('./config.ini'):
     config.read('config.ini')
-  # Else load defaults
-  else:
-    config['input'] = {'inputFolders': os.getcwd(),
-        'maxDepth': 1,
-        'readtxt': 1,
-        'readraw': 1
-      }
-    config['options'] = {'exporttoimg': 1,
-        'exporttotxt': 0,
-        'exporttoraw': 0,
-        'logLevel': 3
-      }
-    config['output'] = {'metafontfamily': 'fonts/CourierPrime-Regular.ttf',
-        'metaFontWeight': 32,
-        'lyricfontfamily': 'fonts/CourierPrime-Regular.ttf',
-        'tablaturefontfamliy': 'fonts/CourierPrime-Bold.ttf',
-        'imageppi': 144,
-        'backgroundColour': '255,255,255',
-        'fontColour': '0,0,0',
-        'metadataColour': '128,128,128',
-        'verticalMargin': 50,
-        'horizontalMargin': 100,
-        'extraHorizontalMargin': 100,
-        'tryToShrinkRatio' : 0.4,
-        'shortestlinewhitespaceratioallowed': 0.95,
-        'longestlinewhitespaceratioallowed': 0.30,
-        'keepEmptyLines': 1,
-        'writeheaderfile': 0,
-        'minPages': 2,
-        'maxPages': 4,
-        'preferEvenPageNumbers': 0
-    }
   # (if CMD arguments: load CMD arguments to override specific settings)
   with open('config.ini', 'w') as configfile:
-    config.write(configfile)
\ No newline at end of file
+    config.write(configfile)
+
+"""!@brief Sets the config from a dict of sections, without reading or writing config.ini
+    Used by worker processes to get the same config as the main process
+    @param configDict dict of section name to dict of settings
+    @return None
+"""
+def loadConfig(configDict):
+  global config
+  config = configparser.ConfigParser()
+  config.read_dict(configDict)
\ No newline at end of file
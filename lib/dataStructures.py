@@ -10,70 +10,183 @@
 # @section notes Notes
 #
 
+import codecs
 import re
+import sys
 import lib.config
-from PIL import ImageFont
+import lib.textMetrics
+import lib.fontSizeSolver
+import lib.pageBreaker
+import lib.lineTable
+import lib.fontPool
 import logging
 
 A4 = {'width': 210, 'height': 297}
 A5 = {'width': 210, 'height': 148}
+# Smallest font size the layout will shrink to
+MIN_FONT_SIZE = 1
+# Supported values of the 'colourMode' setting
+COLOUR_MODES = ['auto', 'RGB', 'L', '1']
+
+"""!@brief Returns the memory used by an object and all objects it refers to
+    Follows lists, tuples, dicts and the slots of the data structures in this file
+    Objects which were already counted, like repeated interned lines, are only counted once
+    @param obj object to measure
+    @param countedIds set of ids of the objects which were already counted
+    @return size in bytes
+"""
+def getDeepSize(obj, countedIds):
+  if id(obj) in countedIds:
+    return 0
+  countedIds.add(id(obj))
+  size = sys.getsizeof(obj)
+  if isinstance(obj, (list, tuple)):
+    size += sum(getDeepSize(item, countedIds) for item in obj)
+  elif isinstance(obj, dict):
+    size += sum(getDeepSize(key, countedIds) + getDeepSize(value, countedIds) for key, value in obj.items())
+  elif isinstance(obj, (Section, Page, Song, lib.lineTable.LineTable)):
+    for slot in type(obj).__slots__:
+      size += getDeepSize(getattr(obj, slot, None), countedIds)
+  return size
 
 """!@brief Removes empty lines and makes sure every line ends with \r\n
     @param inputString raw txt input
     @return string of parsed input
 """
 def stripEmptyLines(inputString, keepEmptyLines):
-  nonEmptyLines = ""
   lines = inputString.split("\n")
-  for line in lines:
-    if keepEmptyLines or line.strip() != "":
-      nonEmptyLines += line + "\r\n"
-  return nonEmptyLines
+  return "".join(line + "\r\n" for line in lines if keepEmptyLines or line.strip() != "")
+
+# Byte order marks and the encoding they indicate, longest first
+BYTE_ORDER_MARKS = [(codecs.BOM_UTF32_LE, 'utf-32'), (codecs.BOM_UTF32_BE, 'utf-32'), (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16')]
+# Encodings tried in order for files without a byte order mark. latin-1 accepts any input
+FALLBACK_ENCODINGS = ['utf-8', 'cp1252', 'latin-1']
+
+"""!@brief Decodes the contents of a text file, detecting its encoding
+    Uses the byte order mark if there is one, otherwise the first encoding which can decode all bytes
+    @param rawBytes contents of the file
+    @return tuple of (decoded string, name of the encoding)
+"""
+def decodeSourceBytes(rawBytes):
+  for byteOrderMark, encoding in BYTE_ORDER_MARKS:
+    if rawBytes.startswith(byteOrderMark):
+      return rawBytes.decode(encoding, errors='replace'), encoding
+  for encoding in FALLBACK_ENCODINGS:
+    try:
+      return rawBytes.decode(encoding), encoding
+    except UnicodeDecodeError:
+      continue
 
 """!@brief Opens a .txt file and loads it's contents into buffer
+    Line endings are converted to '\\n', like when reading the file in text mode
     @param inputFile path to .txt file
     @return .txt file raw contents
 """
 def readSourceFile(inputFile):
-  with open(inputFile, 'r') as file:
-    return file.read()
+  with open(inputFile, 'rb') as file:
+    text, encoding = decodeSourceBytes(file.read())
+  logging.debug("Read '%s' as %s", inputFile, encoding)
+  return text.replace('\r\n', '\n').replace('\r', '\n')
+
+# Any of these characters make it a tablature line
+TABLATURE_SPECIFIC_CHARACTERS = r"/#"
+# Any text character OTHER THAN these make it a lyric line
+NON_LYRIC_TEXT_CHARACTERS = r"abcdefghbxmjn"
+# If there is no text or digit, any of these characters make it a lyric line
+LYRIC_SPECIAL_CHARACTERS = r"."
 
 """!@brief Returns whether the string is a line of lyrics or a line of tablature data
+    Checks each character in order of the rules, logging why a decision was made
     @param inputString single line of text
     @return True if it is tablature data, False if it is lyric data
 """
-def isTablatureData(inputString):
-  if not inputString:
-    return
-  logging.debug("Checking '{}' for line type".format(inputString))
+def classifyLineByCharacters(inputString):
   # Assume tablature line if any character {/, #, (, ), }
-  tablatureSpecificCharacterString = r"/#"
-  if any(elem in inputString for elem in tablatureSpecificCharacterString):
-    logging.debug("'{}' is a tablature line, since it contains a tablature specific character".format(inputString))
+  if any(elem in inputString for elem in TABLATURE_SPECIFIC_CHARACTERS):
+    logging.log(lib.config.TRACE, "'%s' is a tablature line, since it contains a tablature specific character", inputString)
     return True
   # Assume LYRIC line if any TEXT character OTHER THAN {a, b, c, d, e, f, g, h, b, x, m, j, n}
-  lyricSpecificCharacterString = r"abcdefghbxmjn"
   for char in inputString:
     if char.isalpha():
-      if not char.lower() in lyricSpecificCharacterString:
-        logging.debug("'{}' is a lyric line, since it contains lyric specific text characters".format(inputString))
+      if not char.lower() in NON_LYRIC_TEXT_CHARACTERS:
+        logging.log(lib.config.TRACE, "'%s' is a lyric line, since it contains lyric specific text characters", inputString)
         return False
   # Assume tablature line if any digit
   if any(char.isdigit() for char in inputString):
-    logging.debug("'{}' is a tablature line, since it contains a number".format(inputString))
+    logging.log(lib.config.TRACE, "'%s' is a tablature line, since it contains a number", inputString)
     return True
   # Assume LYRIC line if any character {.}
-  lyricSpecialChars = r"."
-  if any(elem in inputString for elem in lyricSpecialChars):
-    logging.debug("'{}' is a lyric line, since it contains lyric specific special characters".format(inputString))
+  if any(elem in inputString for elem in LYRIC_SPECIAL_CHARACTERS):
+    logging.log(lib.config.TRACE, "'%s' is a lyric line, since it contains lyric specific special characters", inputString)
     return False
   # Else warn and assume tablature line
   # logging.warn("Unable to identify if '{}' is a lyric or tablature line. Assuming it is a tablature line. Please improve the isTablatureData function".format(inputString))
   return True
 
+"""!@brief Creates a translation table which maps each ASCII character to the rule it triggers
+    Characters which do not trigger any rule are removed
+    @return dict to be used with str.translate
+"""
+def createLineClassTable():
+  table = {}
+  for code in range(128):
+    char = chr(code)
+    if char in TABLATURE_SPECIFIC_CHARACTERS:
+      table[code] = 't'
+    elif char.isalpha() and not char.lower() in NON_LYRIC_TEXT_CHARACTERS:
+      table[code] = 'l'
+    elif char.isdigit():
+      table[code] = 'd'
+    elif char in LYRIC_SPECIAL_CHARACTERS:
+      table[code] = 's'
+    else:
+      table[code] = None
+  return table
+
+LINE_CLASS_TABLE = createLineClassTable()
+
+"""!@brief Returns whether an ASCII string is a line of lyrics or a line of tablature data
+    Translates the line to the rules its characters trigger in a single pass
+    @param inputString single line of ASCII text
+    @return True if it is tablature data, False if it is lyric data
+"""
+def classifyAsciiLine(inputString):
+  lineClasses = set(inputString.translate(LINE_CLASS_TABLE))
+  if 't' in lineClasses:
+    return True
+  if 'l' in lineClasses:
+    return False
+  if 'd' in lineClasses:
+    return True
+  return not 's' in lineClasses
+
+"""!@brief Returns whether the string is a line of lyrics or a line of tablature data
+    @param inputString single line of text
+    @return True if it is tablature data, False if it is lyric data
+"""
+def isTablatureData(inputString):
+  if not inputString:
+    return
+  if inputString.isascii() and not logging.root.isEnabledFor(lib.config.TRACE):
+    return classifyAsciiLine(inputString)
+  logging.log(lib.config.TRACE, "Checking '%s' for line type", inputString)
+  return classifyLineByCharacters(inputString)
+
+"""!@brief Returns for each line whether it is a line of lyrics or a line of tablature data
+    @param lines list of single lines of text
+    @return list of True for tablature data, False for lyric data and None for empty lines
+"""
+def classifyLines(lines):
+  if logging.root.isEnabledFor(lib.config.TRACE):
+    return [isTablatureData(line) for line in lines]
+  return [(classifyAsciiLine(line) if line.isascii() else classifyLineByCharacters(line)) if line else None for line in lines]
+
 """!@brief Class containing Section specific data
 """
 class Section:
+  __slots__ = ('lyrics', 'tablatures', 'header', 'rawData', 'isParsed', 'expectedWidth', 'expectedHeight')
+
   def __init__(self):
     # List of lines of lyrics strings
     self.lyrics = []
@@ -81,7 +194,7 @@ class Section:
     self.tablatures = []
     # section type string
     self.header = ""
-    # string of tablature and lyric data
+    # string of tablature and lyric data, cleared once it has been parsed
     self.rawData = ""
     # Flag for succesfully parsed
     self.isParsed = False
@@ -90,6 +203,8 @@ class Section:
     self.expectedHeight = -1
 
   """!@brief Calculates dimensions of rendered text
+    @param fontTablature PIL.ImageFont.FreeTypeFont object used for the header and tablature lines
+    @param fontLyrics PIL.ImageFont.FreeTypeFont object used for the lyric lines
     @return None
   """
   def calculateSectionDimensions(self, fontTablature, fontLyrics):
@@ -98,26 +213,26 @@ class Section:
     heightSum = 0
     maxWidth = 0
     # consider section title
-    logging.debug("Init size with header '{}'".format(self.header))
-    headerWidth, headerHeight = fontTablature.getsize(self.header)
+    logging.debug("Init size with header '%s'", self.header)
+    headerWidth, headerHeight = lib.textMetrics.getTextSize(fontTablature, self.header)
     heightSum += headerHeight
     maxWidth = headerWidth
     while lineIterator < amountOfLines:
       # Get chord&lyric line dimensions
-      lyricTextWidth, lyricTextHeight = fontLyrics.getsize(self.lyrics[lineIterator])
-      tablatureTextWidth, chordTextHeight = fontTablature.getsize(self.tablatures[lineIterator])
+      lyricTextWidth, lyricTextHeight = lib.textMetrics.getTextSize(fontLyrics, self.lyrics[lineIterator])
+      tablatureTextWidth, chordTextHeight = lib.textMetrics.getTextSize(fontTablature, self.tablatures[lineIterator])
       heightSum += lyricTextHeight + chordTextHeight
       if lyricTextWidth > maxWidth:
-        logging.debug("Found line '{}' with a width of {}".format(self.lyrics[lineIterator], lyricTextWidth))
+        logging.log(lib.config.TRACE, "Found line '%s' with a width of %s", self.lyrics[lineIterator], lyricTextWidth)
         maxWidth = lyricTextWidth
       if tablatureTextWidth > maxWidth:
-        logging.debug("Found line '{}' with a width of {}".format(self.tablatures[lineIterator], tablatureTextWidth))
+        logging.log(lib.config.TRACE, "Found line '%s' with a width of %s", self.tablatures[lineIterator], tablatureTextWidth)
         maxWidth = tablatureTextWidth
       lineIterator += 1
-    logging.debug("Setting section to W:{} H:{}".format(maxWidth, heightSum))
+    logging.debug("Setting section to W:%s H:%s", maxWidth, heightSum)
     self.expectedWidth = maxWidth
     self.expectedHeight = heightSum
-    
+
   """!@brief Converts raw buffered data into separate Lyric and tablature lines
       @return None
   """
@@ -127,15 +242,15 @@ class Section:
     # Input sections may have tablature-only or lyric-only sections
     # So we have to insert empty lines if we have subsequent tablature or lyric lines
     lines = self.rawData.splitlines(True)
-    for line in lines:
+    # Determine lyric or tablature line
+    lineTypes = classifyLines(lines)
+    for line, currentIsTablature in zip(lines, lineTypes):
       # Empty line whitespace
       if not line:
         self.lyrics.append("")
         self.tablatures.append("") 
         continue 
-      # Determine lyric or tablature line
-      currentIsTablature = isTablatureData(line)
-      logging.debug("Have line {} isTab={}, isLyric={}".format(line, currentIsTablature, not currentIsTablature))
+      logging.log(lib.config.TRACE, "Have line %s isTab=%s, isLyric=%s", line, currentIsTablature, not currentIsTablature)
       # Initially just fill in the first line correctly
       if isFirstLine:
         isFirstLine = False
@@ -147,16 +262,16 @@ class Section:
       # we need to insert an empty line of the other type
       elif currentIsTablature == prevWasTablature:
         if currentIsTablature:
-          logging.debug("Inserting empty Lyric line")
+          logging.log(lib.config.TRACE, "Inserting empty Lyric line")
           self.tablatures.append(line)
           self.lyrics.append("")
         else:
-          logging.debug("Inserting empty tablature line")
+          logging.log(lib.config.TRACE, "Inserting empty tablature line")
           self.lyrics.append(line)
           self.tablatures.append("")
       # also insert the current line
       elif currentIsTablature:
-        logging.debug("Inserting empty Lyric line")
+        logging.log(lib.config.TRACE, "Inserting empty Lyric line")
         self.tablatures.append(line)
       else:
         self.lyrics.append(line)
@@ -164,18 +279,25 @@ class Section:
       prevWasTablature = currentIsTablature
     # Simple check to see if it probably exported correctly
     if abs(len(self.lyrics) - len(self.tablatures)) > 1:
-      logging.error("Unable to parse section {}, since there is a mismatch between the amount of lyrics ({}) and tablature ({}) lines.".format(self.header, len(self.lyrics), len(self.tablatures)))
+      logging.error("Unable to parse section %s, since there is a mismatch between the amount of lyrics (%s) and tablature (%s) lines.", self.header, len(self.lyrics), len(self.tablatures))
       return
     # Add a trailing empty line if necessary
     elif len(self.lyrics) > len(self.tablatures):
       self.tablatures.append("")
     elif len(self.lyrics) < len(self.tablatures):
       self.lyrics.append("")
+    # Repeated lines, like the chords of each verse, share a single string
+    self.header = sys.intern(self.header)
+    self.tablatures = [sys.intern(line) for line in self.tablatures]
+    self.lyrics = [sys.intern(line) for line in self.lyrics]
+    self.rawData = ""
     self.isParsed = True
 
 """!@brief Class containing Sections which fit on 1 page
 """
 class Page:
+  __slots__ = ('sections', 'totalHeight')
+
   def __init__(self):
     self.sections = []
     self.totalHeight = -1
@@ -183,6 +305,14 @@ class Page:
 """!@brief Class containing Song specific data
 """ 
 class Song:
+  __slots__ = ('inputFile', 'outputLocation', 'fileExtension', 'title', 'sections', 'metadata', 'metadataWidth', 'metadataHeight',
+      'pages', 'layoutPlan', 'lineTable', 'transposition', 'isParsed', 'verticalMargin', 'horizontalMargin', 'extraHorizontalMargin',
+      'fontColour', 'backgroundColour', 'metadataColour', 'ppi', 'imageWidth', 'imageHeight', 'fontSize',
+      'fontFamilyLyrics', 'fontFamilyTablature', 'metadataFontsize', 'metadataFontFamily', 'tryToShrinkRatio',
+      'longestLineWhitespaceRatioAllowed', 'shortestLineWhitespaceRatioAllowed', 'keepEmptyLines', 'writeMetadata',
+      'minPages', 'preferEvenPageNumbers', 'maxPages', 'monospaceLayout', 'pngCompressLevel', 'colourMode',
+      'ditherMetadata', 'pdfEmbedFonts', 'svgEmbedFonts')
+
   def __init__(self):
     # Src file
     self.inputFile = ""
@@ -197,10 +327,14 @@ class Song:
     self.metadata = ""
     self.metadataWidth = -1
     self.metadataHeight = -1
-    # String of entire input
-    self.rawData = ""
     # List of pages, which contain sections which fit on a page
     self.pages = []
+    # lib.layoutPlan.LayoutPlan object, the positions of all lines once the song has been laid out
+    self.layoutPlan = None
+    # lib.lineTable.LineTable object of the parsed sections, created when first needed by a monospace layout
+    self.lineTable = None
+    # Amount of semitones the chords have been transposed by, see lib.transpose
+    self.transposition = 0
     # Flag for succesfully parsed
     self.isParsed = False
     configObj = lib.config.config['output']
@@ -218,13 +352,11 @@ class Song:
     # Since font size is then shrunk and grown to fit whitespace we do not need to be as accurate
     # PPI of 144 -> fontSize of 32
     self.fontSize = int(self.ppi / 4)
-    self.fontLyrics = ImageFont.truetype(configObj['lyricfontfamily'], self.fontSize)
-    self.fontTablature = ImageFont.truetype(configObj['tablaturefontfamliy'], self.fontSize)
-    self.fontFamilyLyrics = configObj['lyricfontfamily']
-    self.fontFamilyTablature = configObj['tablaturefontfamliy']
+    # Fonts are looked up in the font pool by family and size, so all songs share them
+    self.fontFamilyLyrics = sys.intern(configObj['lyricfontfamily'])
+    self.fontFamilyTablature = sys.intern(configObj['tablaturefontfamliy'])
     self.metadataFontsize = int(configObj['metaFontWeight'])
-    self.metadataFontFamily = configObj['metafontfamily']
-    self.fontMetadata = ImageFont.truetype(self.metadataFontFamily, self.metadataFontsize)
+    self.metadataFontFamily = sys.intern(configObj['metafontfamily'])
     # Allowed whitespace to total width ratios. Makes stuff smaller but fit on less pages, probably
     # percentage of missing whitespace on total page height it wants before it tries to resize down
     self.tryToShrinkRatio = float(configObj['tryToShrinkRatio'])
@@ -242,6 +374,70 @@ class Song:
     self.minPages = int(configObj['minPages'])
     self.preferEvenPageNumbers = int(configObj['preferEvenPageNumbers'])
     self.maxPages = max(int(configObj['minPages']), int(configObj['maxPages']))
+    # Calculate dimensions from the amount of characters if the fonts are monospace
+    self.monospaceLayout = configObj['monospaceLayout'] == '1'
+    # zlib compression level of written PNG files, from 0 (none) to 9 (smallest)
+    self.pngCompressLevel = int(configObj['pngCompressLevel'])
+    # Image mode of rendered pages: 'RGB', 'L' (grayscale), '1' (black and white) or 'auto'
+    # Unknown modes fall back to 'auto', which main warns about once
+    colourMode = configObj['colourMode'].strip()
+    self.colourMode = sys.intern(colourMode if colourMode in COLOUR_MODES else 'auto')
+    # Dither the metadata on black and white pages, so that a gray metadataColour stays gray
+    self.ditherMetadata = configObj['ditherMetadata'] == '1'
+    # Embed text using the TrueType fonts in PDF output, instead of rasterized pages
+    self.pdfEmbedFonts = configObj['pdfEmbedFonts'] == '1'
+    # Embed the font files in SVG output, instead of linking to them
+    self.svgEmbedFonts = configObj['svgEmbedFonts'] == '1'
+
+  """!@brief Font of the lyric lines at the current font size
+  """
+  @property
+  def fontLyrics(self):
+    return lib.fontPool.getFont(self.fontFamilyLyrics, self.fontSize)
+
+  """!@brief Font of the headers and tablature lines at the current font size
+  """
+  @property
+  def fontTablature(self):
+    return lib.fontPool.getFont(self.fontFamilyTablature, self.fontSize)
+
+  """!@brief Font of the metadata at the current metadata font size
+  """
+  @property
+  def fontMetadata(self):
+    return lib.fontPool.getFont(self.metadataFontFamily, self.metadataFontsize)
+
+  """!@brief Returns the memory used by this song, its sections, pages and layout plan
+    Fonts are shared by all songs and are not included
+    @return size in bytes
+  """
+  def getMemoryUsage(self):
+    return getDeepSize(self, set())
+
+  """!@brief Forgets the parsed sections and layout, so the input file can be parsed into this song again
+    The font sizes go back to their initial values, so the song gets laid out like a new Song object
+    @return None
+  """
+  def clearParseResults(self):
+    self.sections = []
+    self.metadata = ""
+    self.metadataWidth = -1
+    self.metadataHeight = -1
+    self.pages = []
+    self.layoutPlan = None
+    self.lineTable = None
+    self.isParsed = False
+    self.fontSize = int(self.ppi / 4)
+    self.metadataFontsize = int(lib.config.config['output']['metaFontWeight'])
+
+  """!@brief Creates a shallow copy of the song, sharing its sections and settings
+    @return new Song object
+  """
+  def copy(self):
+    songCopy = Song.__new__(Song)
+    for slot in Song.__slots__:
+      setattr(songCopy, slot, getattr(self, slot))
+    return songCopy
 
 
   """!@brief Calculates dimensions of metadata
@@ -252,18 +448,28 @@ class Song:
     # metadata starts topMargin removed from top
     currentHeight = self.verticalMargin
     maxWidth = 0
+    if self.monospaceLayout:
+      metrics = lib.textMetrics.getMonospaceMetrics(self.fontMetadata)
+      if metrics:
+        advance, lineHeight = metrics
+        lines = [line.rstrip() for line in self.metadata.split('\n')]
+        lines = [line for line in lines if line]
+        self.metadataWidth = lib.textMetrics.getMonospaceWidth(advance, max(map(len, lines), default=0))
+        self.metadataHeight = currentHeight + len(lines) * lineHeight
+        logging.debug("metadata dimensions are %sh : %sw", self.metadataHeight, self.metadataWidth)
+        return
     for line in self.metadata.split('\n'):
       line = line.rstrip()
       if not line:
         continue
-      metadataTextWidth, metadataTextHeight = self.fontMetadata.getsize(line)
+      metadataTextWidth, metadataTextHeight = lib.textMetrics.getTextSize(self.fontMetadata, line)
       if metadataTextWidth > maxWidth:
-        logging.debug("Found line '{}' with a width of {}".format(line, metadataTextWidth))
+        logging.log(lib.config.TRACE, "Found line '%s' with a width of %s", line, metadataTextWidth)
         maxWidth = metadataTextWidth
       currentHeight += metadataTextHeight
     self.metadataWidth = maxWidth
     self.metadataHeight = currentHeight
-    logging.debug("metadata dimensions are {}h : {}w".format(currentHeight, maxWidth))
+    logging.debug("metadata dimensions are %sh : %sw", currentHeight, maxWidth)
 
   """!@brief Resizes all sections by a specified amount
     Also recalculates all section sizes afterwards
@@ -271,19 +477,32 @@ class Song:
     @return None
   """
   def resizeAllSections(self, mutator):
-    logging.debug("Resizing font by {} to {}".format(mutator, self.fontSize))
+    logging.debug("Resizing font by %s to %s", mutator, self.fontSize)
     self.fontSize += mutator
-    self.fontLyrics = ImageFont.truetype(self.fontFamilyLyrics, self.fontSize)
-    self.fontTablature = ImageFont.truetype(self.fontFamilyTablature, self.fontSize)
     self.prerenderSections()
 
+  """!@brief Sets the font size of all sections and recalculates all section sizes
+    @param fontSize new font size
+    @return None
+  """
+  def setFontSize(self, fontSize):
+    if fontSize != self.fontSize:
+      self.resizeAllSections(fontSize - self.fontSize)
+
+  """!@brief Sets the font size of all sections and recalculates the Pages
+    @param fontSize new font size
+    @return None
+  """
+  def setFontSizeAndPaginate(self, fontSize):
+    self.setFontSize(fontSize)
+    self.sectionsToPages()
+
   """!@brief Resizes metadata and recalcs its size
     @param mutator amount of fontSize to add/dec from current font size
     @return None
   """
   def resizeMetadata(self, mutator):
     self.metadataFontsize += mutator
-    self.fontMetadata = ImageFont.truetype(self.metadataFontFamily, self.metadataFontsize)
     self.calculateMetadataDimensions()
 
   """!@brief Calculates the expected dimensions of all sections
@@ -291,20 +510,73 @@ class Song:
   """
   def prerenderSections(self):
     self.calculateMetadataDimensions()
+    monospaceMetrics = self.getMonospaceMetrics(self.fontSize)
+    if monospaceMetrics:
+      sectionDimensions = lib.lineTable.getSectionDimensions(self.getLineTable(), *monospaceMetrics)
+      for section, (width, height) in zip(self.sections, sectionDimensions):
+        section.expectedWidth = width
+        section.expectedHeight = height
+      return
     for section in self.sections:
       section.calculateSectionDimensions(self.fontTablature, self.fontLyrics)
 
+  """!@brief Returns the line table of the parsed sections, creating it the first time
+    @return lib.lineTable.LineTable object
+  """
+  def getLineTable(self):
+    if self.lineTable is None:
+      self.lineTable = lib.lineTable.LineTable(self.sections)
+    return self.lineTable
+
+  """!@brief Returns the monospace metrics of the tablature and lyric fonts at a font size
+    @param fontSize font size of the tablature and lyric fonts
+    @return tuple of (tablature metrics, lyric metrics), or None if not using a monospace layout
+  """
+  def getMonospaceMetrics(self, fontSize):
+    if not self.monospaceLayout:
+      return None
+    tablatureMetrics = lib.textMetrics.getMonospaceMetrics(lib.fontPool.getFont(self.fontFamilyTablature, fontSize))
+    lyricMetrics = lib.textMetrics.getMonospaceMetrics(lib.fontPool.getFont(self.fontFamilyLyrics, fontSize))
+    if tablatureMetrics and lyricMetrics:
+      return tablatureMetrics, lyricMetrics
+    return None
+
   """!@brief Calculates the expected dimensions of all sections
     @return None
   """
   def fitSectionsByWidth(self):
     self.prerenderSections()
-    while not self.checkOverflowX():
+    if not self.checkOverflowX():
       logging.debug("Resizing down to prevent overflow on the width of the page")
-      self.resizeAllSections(-1)
-    while not self.checkOverflowMetadata():
+      def fitsOnWidth(fontSize):
+        return self.checkOverflowXAtSize(fontSize)
+      fontSize, evaluations = lib.fontSizeSolver.findLargestFittingSize(fitsOnWidth, MIN_FONT_SIZE, self.fontSize)
+      self.setFontSize(fontSize)
+      logging.info("Fitted sections on the width of the page at font size %s after evaluating %s sizes", fontSize, evaluations)
+    if not self.checkOverflowMetadata():
       logging.debug("Resizing down to prevent metadata overflow on the width of the page")
-      self.resizeMetadata(-1)
+      def metadataFitsOnWidth(fontSize):
+        self.resizeMetadata(fontSize - self.metadataFontsize)
+        return self.checkOverflowMetadata()
+      fontSize, evaluations = lib.fontSizeSolver.findLargestFittingSize(metadataFitsOnWidth, MIN_FONT_SIZE, self.metadataFontsize)
+      self.resizeMetadata(fontSize - self.metadataFontsize)
+      logging.info("Fitted metadata on the width of the page at font size %s after evaluating %s sizes", fontSize, evaluations)
+
+  """!@brief Resizes down until the Pages fit within the maximum amount of pages
+    Assumes the Pages have been calculated for the current font size
+    @return None
+  """
+  def decreaseToMaxPages(self):
+    if self.countMinimumPages() <= self.maxPages:
+      return
+    logging.debug("Resizing down since we need %s pages and want %s pages", self.countMinimumPages(), self.maxPages)
+    def fitsOnMaxPages(fontSize):
+      return self.countMinimumPagesAtSize(fontSize) <= self.maxPages
+    fontSize, evaluations = lib.fontSizeSolver.findLargestFittingSize(fitsOnMaxPages, MIN_FONT_SIZE, self.fontSize)
+    self.setFontSizeAndPaginate(fontSize)
+    logging.info("Fitted %s pages at font size %s after evaluating %s sizes", len(self.pages), fontSize, evaluations)
+    if len(self.pages) > self.maxPages:
+      logging.warning("Could not fit the song on %s pages, it needs %s pages at font size %s", self.maxPages, len(self.pages), fontSize)
 
   """!@brief Checks whether we are overflowing on the width of the page
     @return True if everything OK, False if overflowing
@@ -312,9 +584,21 @@ class Song:
   def checkOverflowX(self):
     for section in self.sections:
       if section.expectedWidth > self.imageWidth - self.extraHorizontalMargin - self.horizontalMargin - self.horizontalMargin:
-        logging.debug("There is an overflow on width: this section has a width of {}, but we have {} ({}-{}-{}*2) amount of space".format(section.expectedWidth, self.imageWidth - self.extraHorizontalMargin - self.horizontalMargin - self.horizontalMargin, self.imageWidth, self.extraHorizontalMargin, self.horizontalMargin))
+        logging.debug("There is an overflow on width: this section has a width of %s, but we have %s (%s-%s-%s*2) amount of space", section.expectedWidth, self.imageWidth - self.extraHorizontalMargin - self.horizontalMargin - self.horizontalMargin, self.imageWidth, self.extraHorizontalMargin, self.horizontalMargin)
         return False
     return True
+
+  """!@brief Checks whether we would overflow on the width of the page at a font size
+    With a monospace layout this only looks at the line table, otherwise the font size gets changed
+    @param fontSize font size of the tablature and lyric fonts
+    @return True if everything OK, False if overflowing
+  """
+  def checkOverflowXAtSize(self, fontSize):
+    monospaceMetrics = self.getMonospaceMetrics(fontSize)
+    if monospaceMetrics is None:
+      self.setFontSize(fontSize)
+      return self.checkOverflowX()
+    return lib.lineTable.getWidestLine(self.getLineTable(), *monospaceMetrics) <= self.imageWidth - self.extraHorizontalMargin - self.horizontalMargin - self.horizontalMargin
   
   """!@brief Checks whether the metadata is overflowing on the width of the page
     @return True if everything OK, False if overflowing
@@ -328,131 +612,209 @@ class Song:
     @return None
   """
   def increaseToMinPages(self):
-    targetPageAmount = max(len(self.pages), self.minPages)
-    if (targetPageAmount % 2) != 0 and self.preferEvenPageNumbers:
-      targetPageAmount += 1
-      logging.info("Increasing target page amount to {} to make it an even number".format(targetPageAmount))
+    targetPageAmount = self.getTargetPageAmount(self.countMinimumPages())
     originalFontsize = self.fontSize
-    logging.debug("Starting font size increase with {} pages and {} font size".format(targetPageAmount, originalFontsize))
-    self.resizeAllSections(+1)
-    self.sectionsToPages()
-    currentPageAmount = len(self.pages)
+    logging.debug("Starting font size increase with %s pages and %s font size", targetPageAmount, originalFontsize)
     # Increase fontSize as long as we stay under the target max pages
-    while ((currentPageAmount <= targetPageAmount) and self.checkOverflowX()):
-      self.resizeAllSections(+1)
-      self.sectionsToPages()
-      currentPageAmount = len(self.pages)
-      logging.debug("Current page amount is {} with font size {}".format(currentPageAmount, self.fontSize))
-    # Now undo latest increase to go back to target page amount
-    self.resizeAllSections(-1)
-    self.sectionsToPages()
+    def fitsOnTargetPages(fontSize):
+      pageAmount = self.countMinimumPagesAtSize(fontSize)
+      logging.debug("Current page amount is %s with font size %s", pageAmount, fontSize)
+      return pageAmount <= targetPageAmount and self.checkOverflowXAtSize(fontSize)
+    # A single line can never be larger than the page itself
+    fontSize, evaluations = lib.fontSizeSolver.growLargestFittingSize(fitsOnTargetPages, originalFontsize, self.imageHeight)
+    # Go back to the largest font size which fits on the target page amount
+    self.setFontSizeAndPaginate(fontSize)
+    logging.info("Increased font size to %s after evaluating %s sizes", fontSize, evaluations)
     currentPageAmount = len(self.pages)
     if targetPageAmount != currentPageAmount:
-      logging.warning("Oops! While resizing up we changed the amount of pages from {} to {}".format(targetPageAmount, currentPageAmount))
+      logging.warning("Oops! While resizing up we changed the amount of pages from %s to %s", targetPageAmount, currentPageAmount)
     if self.fontSize != originalFontsize:
-      logging.debug("Managed to change the font size from {} to {}".format(originalFontsize, self.fontSize))
+      logging.debug("Managed to change the font size from %s to %s", originalFontsize, self.fontSize)
       
   
-  """!@brief Tries to fill in the whitespace on the current render
-    It will compare the size of existing whitespace with the size of the first section on the next page
-    While the amount we are short is within X% of the current image height, resize down
-    @return True if we should resize down, False if we are fine
-  """
-  def canFillWhitespace(self):
-    amountOfPages = len(self.pages)
-    currentPageIt = 0
+  """!@brief Checks whether the sections fill enough of the width of the page
+    Small lines should not leave too much whitespace, and neither should the longest lines
+    @return True if the width is filled enough
+  """
+  def fillsEnoughWidth(self):
     totalHorizontalMargin = self.extraHorizontalMargin + self.horizontalMargin + self.horizontalMargin
     imageWidthWithoutMargins = self.imageWidth - totalHorizontalMargin
-    if not amountOfPages:
-      return False
-    # Stop resizing if we are creating too much widespace on the width
-    smallestWhitespace = self.imageHeight
-    biggestWhitespace = -1
-    for page in self.pages:
-      for section in page.sections:
-          # We have 2* horizontal whitespace
-          whitespaceOnWidth = self.imageWidth - totalHorizontalMargin - section.expectedWidth
-          if whitespaceOnWidth < smallestWhitespace:
-            smallestWhitespace = whitespaceOnWidth
-          if whitespaceOnWidth > biggestWhitespace:
-            biggestWhitespace = whitespaceOnWidth
+    if not self.sections:
+      return True
+    smallestWhitespace = min(imageWidthWithoutMargins - section.expectedWidth for section in self.sections)
+    biggestWhitespace = max(imageWidthWithoutMargins - section.expectedWidth for section in self.sections)
     # Sections vary in width, some are very small to begin with
-    logging.debug("The shortest line has {} whitespace, the largest line {}. The image is {} wide with {} total horizontal margins (={}), resulting in a {} min ratio and {} max ratio, with a min limit of {} and a max limit of {}".format(biggestWhitespace, smallestWhitespace, self.imageWidth, totalHorizontalMargin, imageWidthWithoutMargins, biggestWhitespace / imageWidthWithoutMargins, smallestWhitespace / imageWidthWithoutMargins, self.shortestLineWhitespaceRatioAllowed, self.longestLineWhitespaceRatioAllowed))
+    logging.debug("The shortest line has %s whitespace, the largest line %s. The image is %s wide with %s total horizontal margins (=%s), resulting in a %s min ratio and %s max ratio, with a min limit of %s and a max limit of %s", biggestWhitespace, smallestWhitespace, self.imageWidth, totalHorizontalMargin, imageWidthWithoutMargins, biggestWhitespace / imageWidthWithoutMargins, smallestWhitespace / imageWidthWithoutMargins, self.shortestLineWhitespaceRatioAllowed, self.longestLineWhitespaceRatioAllowed)
     # Make sure small lines fill the page enough
     if biggestWhitespace / imageWidthWithoutMargins > self.shortestLineWhitespaceRatioAllowed:
-      logging.debug("Stopping resizing down, since the smallest section has {}% whitespace on the width of the image".format((biggestWhitespace / imageWidthWithoutMargins )* 100))
+      logging.debug("The smallest section has %s%% whitespace on the width of the image", (biggestWhitespace / imageWidthWithoutMargins )* 100)
       return False
     # Make sure the longest lines fill the page enough
     if smallestWhitespace / imageWidthWithoutMargins > self.longestLineWhitespaceRatioAllowed:
-      logging.debug("Stopping resizing down, since we largest section has {}% whitespace on the width of the image".format((smallestWhitespace / imageWidthWithoutMargins )* 100))
-      return False
-    # Make sure the longest lines fill the page enough
-    if self.fontSize < int(self.ppi / 6):
-      logging.debug("Stopping resizing down, since the font size is becoming too small at {}".format(self.fontSize))
+      logging.debug("The largest section has %s%% whitespace on the width of the image", (smallestWhitespace / imageWidthWithoutMargins )* 100)
       return False
-    # get first section on next page, if we have a next page to begin with
-    while currentPageIt < amountOfPages - 1:
-      curPage = self.pages[currentPageIt]
-      nextPage = self.pages[currentPageIt + 1]
-      nextFirstSection = nextPage.sections[0]
-      whitespace = self.imageHeight - curPage.totalHeight
-      amountWeAreShort = nextFirstSection.expectedHeight - whitespace
-      shortInPercentages = amountWeAreShort / self.imageHeight
-      logging.debug("Whitespace {} vs next section height {}".format(whitespace, nextFirstSection.expectedHeight))
-      logging.debug("We are {} short to fit the next image (total image height {} => {}% of total height)".format(amountWeAreShort, self.imageHeight, shortInPercentages*100))
-      # Since we also resize based on minimum required whitespaces, we can be a bit more aggressive with this
-      if shortInPercentages < self.tryToShrinkRatio:
-        return True
-      currentPageIt += 1
-    return False
-      
+    return True
 
-  """!@brief Fits current sections into pages
-    @return None
+  """!@brief Returns the amount of pages we aim for, given the least amount of pages the sections fit on
+    @param minimumPageAmount least amount of pages the sections fit on at the current font size
+    @return amount of pages
   """
-  def sectionsToPages(self):
+  def getTargetPageAmount(self, minimumPageAmount):
+    pageAmount = max(minimumPageAmount, self.minPages)
+    if (pageAmount % 2) != 0 and self.preferEvenPageNumbers:
+      pageAmount += 1
+    # Every page needs at least one section
+    return max(min(pageAmount, len(self.sections)), minimumPageAmount)
+
+  """!@brief Returns the heights used to divide the sections over pages
+    Uses the sizes calculated by prerenderSections
+    @return tuple of (list of (height, block height) of each section, start height on the first page, start height on other pages), or None if a section was not processed
+  """
+  def getPageBreakInput(self):
+    for section in self.sections:
+      if (section.expectedHeight == -1 or section.expectedWidth == -1):
+        logging.critical("Warning: this file was not processed correctly. The expected dimensions are not set")
+        return None
+    return self.createPageBreakInput([section.expectedHeight for section in self.sections], self.fontTablature)
+
+  """!@brief Returns the heights used to divide the sections over pages, given the height of each section
+    @param sectionHeights list of the expected height of each section
+    @param fontTablature PIL.ImageFont.FreeTypeFont object used for the headers
+    @return tuple of (list of (height, block height) of each section, start height on the first page, start height on other pages)
+  """
+  def createPageBreakInput(self, sectionHeights, fontTablature):
     # If we are keeping whitespace, don't count the whitespace in between sections
     sectionWhitespace = self.verticalMargin
     if self.keepEmptyLines:
       sectionWhitespace = 0
-    self.prerenderSections()
-    self.pages = []
+    sections = []
+    for section, height in zip(self.sections, sectionHeights):
+      # Add setion header size and size of lines of data, and the margin between each section
+      headerWidth, headerHeight = lib.textMetrics.getTextSize(fontTablature, section.header)
+      sections.append((height, headerHeight + height + sectionWhitespace))
     # First page contains metadata
-    currentHeight = self.verticalMargin
-    currentHeight += self.metadataHeight
-    currentHeight += sectionWhitespace
-    curPage = Page()
-    # Now fit all sections
-    for section in self.sections:
-      if (section.expectedHeight == -1 or section.expectedWidth == -1):
-        logging.critical("Warning: this file was not processed correctly. The expected dimensions are not set")
-        self.pages = []
+    return sections, self.verticalMargin + self.metadataHeight + sectionWhitespace, sectionWhitespace
+
+  """!@brief Checks whether the metadata gets a page of its own, since the first section does not fit below it
+    @param sections list of (height, block height) of each section
+    @param firstPageStart start height on the first page
+    @param pageStart start height on other pages
+    @param pageHeight height of a page
+    @return tuple of (True if the metadata gets a page of its own, start height on the first page containing sections)
+  """
+  def splitMetadataPage(self, sections, firstPageStart, pageStart, pageHeight):
+    if sections and firstPageStart + sections[0][0] > pageHeight:
+      return True, pageStart
+    return False, firstPageStart
+
+  """!@brief Returns the least amount of pages, including a page holding only the metadata, the sections fit on
+    @param sections list of (height, block height) of each section
+    @param firstPageStart start height on the first page
+    @param pageStart start height on other pages
+    @param pageHeight height of a page
+    @return amount of pages
+  """
+  def countPages(self, sections, firstPageStart, pageStart, pageHeight):
+    metadataPage, firstPageStart = self.splitMetadataPage(sections, firstPageStart, pageStart, pageHeight)
+    return int(metadataPage) + lib.pageBreaker.countMinimumPages(sections, firstPageStart, pageStart, pageHeight)
+
+  """!@brief Returns the least amount of pages the sections fit on at the current font size
+    @param extraHeight amount of pixels to add to the height of each page
+    @return amount of pages
+  """
+  def countMinimumPages(self, extraHeight=0):
+    pageBreakInput = self.getPageBreakInput()
+    if pageBreakInput is None:
+      return 0
+    sections, firstPageStart, pageStart = pageBreakInput
+    return self.countPages(sections, firstPageStart, pageStart, self.imageHeight + extraHeight)
+
+  """!@brief Returns the least amount of pages the sections fit on at a font size
+    With a monospace layout this only looks at the line table, otherwise the font size gets changed
+    @param fontSize font size of the tablature and lyric fonts
+    @return amount of pages
+  """
+  def countMinimumPagesAtSize(self, fontSize):
+    monospaceMetrics = self.getMonospaceMetrics(fontSize)
+    if monospaceMetrics is None:
+      self.setFontSize(fontSize)
+      return self.countMinimumPages()
+    sectionHeights = lib.lineTable.getSectionHeights(self.getLineTable(), *monospaceMetrics)
+    sections, firstPageStart, pageStart = self.createPageBreakInput(sectionHeights, lib.fontPool.getFont(self.fontFamilyTablature, fontSize))
+    return self.countPages(sections, firstPageStart, pageStart, self.imageHeight)
+
+  """!@brief Shrinks the font size if that lets the sections fit on fewer pages
+    Only shrinks if the sections fit on one page less with at most tryToShrinkRatio of the
+    page height extra, and the sections still fill enough of the width at the smaller size
+    Assumes the Pages have been calculated for the current font size
+    @return None
+  """
+  def shrinkToFewerPages(self):
+    smallestFontSize = int(self.ppi / 6)
+    while self.fontSize > smallestFontSize:
+      pageAmount = self.countMinimumPages()
+      # Only worth it if it changes the amount of pages we end up with
+      if pageAmount <= 1 or self.getTargetPageAmount(pageAmount - 1) >= self.getTargetPageAmount(pageAmount):
+        return
+      # Find how much higher the pages would need to be to need one page less
+      def fitsWithExtraHeight(extraHeight):
+        return self.countMinimumPages(extraHeight) >= pageAmount
+      extraHeight, evaluations = lib.fontSizeSolver.findLargestFittingSize(fitsWithExtraHeight, -1, self.imageHeight)
+      extraHeight += 1
+      logging.debug("We are %s short to fit on %s pages (total image height %s => %s%% of total height)", extraHeight, pageAmount - 1, self.imageHeight, extraHeight / self.imageHeight * 100)
+      # Since we also resize based on minimum required whitespaces, we can be a bit more aggressive with this
+      if extraHeight / self.imageHeight >= self.tryToShrinkRatio:
         return
-      # See if the section would fit on the current page - if it does not, we have a filled page
-      if currentHeight + section.expectedHeight > self.imageHeight:
-        curPage.totalHeight = currentHeight
-        self.pages.append(curPage)
-        currentHeight = sectionWhitespace
-        curPage = Page()
-      # Add setion header size and size of lines of data
-      headerWidth, headerHeight = self.fontTablature.getsize(section.header)
-      currentHeight += headerHeight
-      currentHeight += section.expectedHeight
-      curPage.sections.append(section)
-      # Margin between each section
-      currentHeight += sectionWhitespace
-    # No more sections left, so the current buffered image is ready to be written to file
-    curPage.totalHeight = currentHeight
-    self.pages.append(curPage)
-
-  """!@brief Parses self.rawData into Section objects and metadata
+      originalFontSize = self.fontSize
+      def fitsOnFewerPages(fontSize):
+        return self.countMinimumPagesAtSize(fontSize) < pageAmount
+      if not fitsOnFewerPages(smallestFontSize):
+        logging.debug("Not resizing down, since the font size would become too small")
+        self.setFontSizeAndPaginate(originalFontSize)
+        return
+      fontSize, evaluations = lib.fontSizeSolver.findLargestFittingSize(fitsOnFewerPages, smallestFontSize, originalFontSize)
+      self.setFontSizeAndPaginate(fontSize)
+      if not self.fillsEnoughWidth():
+        logging.debug("Not resizing down, since the sections would leave too much whitespace on the width of the page")
+        self.setFontSizeAndPaginate(originalFontSize)
+        return
+      logging.info("Resized down from font size %s to %s to fit on %s pages after evaluating %s sizes", originalFontSize, fontSize, pageAmount - 1, evaluations)
+
+  """!@brief Divides the sections over the least amount of pages, spreading the whitespace as evenly as possible
+    More pages are only used by increasing the font size, so that they get filled
+    @return None
+  """
+  def sectionsToPages(self):
+    self.prerenderSections()
+    self.pages = []
+    pageBreakInput = self.getPageBreakInput()
+    if pageBreakInput is None:
+      return
+    sections, firstPageStart, pageStart = pageBreakInput
+    # If the first section does not even fit below the metadata, the metadata gets a page of its own
+    metadataStart = firstPageStart
+    hasMetadataPage, firstPageStart = self.splitMetadataPage(sections, firstPageStart, pageStart, self.imageHeight)
+    pageAmount = lib.pageBreaker.countMinimumPages(sections, firstPageStart, pageStart, self.imageHeight)
+    breaks = lib.pageBreaker.findPageBreaks(sections, firstPageStart, pageStart, self.imageHeight, pageAmount)
+    if hasMetadataPage:
+      metadataPage = Page()
+      metadataPage.totalHeight = metadataStart
+      self.pages.append(metadataPage)
+    for pageIt in range(len(breaks) - 1):
+      curPage = Page()
+      curPage.sections = self.sections[breaks[pageIt]:breaks[pageIt + 1]]
+      curPage.totalHeight = firstPageStart if pageIt == 0 else pageStart
+      curPage.totalHeight += sum(blockHeight for height, blockHeight in sections[breaks[pageIt]:breaks[pageIt + 1]])
+      self.pages.append(curPage)
+    logging.debug("Divided %s sections over %s pages", len(self.sections), len(self.pages))
+
+  """!@brief Reads the input file and parses it into Section objects and metadata
     Assumes the raw data is preprocessed, so it parses it using set rules instead of guessing line attributes
       @return None
   """
   def initPreprocessed(self):
     # Get raw data
-    self.rawData = readSourceFile(self.inputFile)
-    parseData = self.rawData
+    parseData = readSourceFile(self.inputFile)
     # While not EOF: build sections until new section found.
     delimiterIndex = parseData.find("[")
     if delimiterIndex == -1:
@@ -460,19 +822,19 @@ class Song:
       return
     # Start with metadata
     self.metadata = parseData[:delimiterIndex]
-    logging.debug("Set '{}' as metadata".format(self.metadata))
+    logging.debug("Set '%s' as metadata", self.metadata)
     parseData = parseData[delimiterIndex:]
     # We are now at the start of the first section, at the '[' character
     lines = parseData.splitlines(True)
     if not len(lines):
       return
-    logging.debug("We found {} lines of data".format(len(lines)))
+    logging.debug("We found %s lines of data", len(lines))
     # Init first section by popping the delimiter
     thisSection = Section()
     thisSection.header = lines.pop(0)
     # First line is always tab->lyric
     isTabLine = True
-    logging.debug("First header is '{}'".format(thisSection.header))
+    logging.debug("First header is '%s'", thisSection.header)
     for line in lines:
       # If it is a [header], it is a new section
       if line[0] == '[':
@@ -486,15 +848,15 @@ class Song:
         # Reset, new section
         thisSection = Section()
         thisSection.header = line
-        logging.debug("Header is '{}'".format(thisSection.header))
+        logging.debug("Header is '%s'", thisSection.header)
         isTabLine = True
       # Else is has lines in order tabline->lyricline->repeat
       elif isTabLine:
-        logging.debug("Adding Tabline is '{}'".format(line))
+        logging.log(lib.config.TRACE, "Adding Tabline is '%s'", line)
         thisSection.tablatures.append(line)
         isTabLine = False
       else:
-        logging.debug("Adding Lyricline is '{}'".format(line))
+        logging.log(lib.config.TRACE, "Adding Lyricline is '%s'", line)
         thisSection.lyrics.append(line)
         isTabLine = True
     # Add final section data
@@ -506,15 +868,14 @@ class Song:
       return
     self.isParsed = True
     
-  """!@brief Parses self.rawData into Section objects and metadata
+  """!@brief Reads the input file and parses it into Section objects and metadata
       @return None
   """
   def initSections(self):
     # Get raw data
-    self.rawData = readSourceFile(self.inputFile)
     # Clean up input
-    parseData = stripEmptyLines(self.rawData, self.keepEmptyLines)
-    logging.debug("Clean data='{}'\n".format(parseData))
+    parseData = stripEmptyLines(readSourceFile(self.inputFile), self.keepEmptyLines)
+    logging.log(lib.config.TRACE, "Clean data='%s'\n", parseData)
     # While not EOF: build sections until new section found.
     delimiterIndex = parseData.find("[")
     if delimiterIndex == -1:
@@ -522,32 +883,34 @@ class Song:
       return
     # Start with metadata
     self.metadata = parseData[:delimiterIndex]
-    logging.debug("Set '{}' as metadata".format(self.metadata))
-    parseData = parseData[delimiterIndex:]
+    logging.debug("Set '%s' as metadata", self.metadata)
+    # Walk through the buffer by index, so the remaining data does not get copied for each section
+    position = delimiterIndex
+    dataLength = len(parseData)
     # We are now at the start of the first section, at the '[' character
-    while parseData:
+    while position < dataLength:
       # Init new Section object
       thisSection = Section()
       # Get header on the first line
-      delimiterIndex = parseData.find("]\r\n")
+      delimiterIndex = parseData.find("]\r\n", position)
       if delimiterIndex == -1:
         logging.error("Cannot parse input file, delimiter did not match '[<sectionName>]'")
         return
       # Skip the ']\r\n' characters
-      thisSection.header = parseData[:delimiterIndex+3]
-      parseData = parseData[delimiterIndex+3:]
+      thisSection.header = parseData[position:delimiterIndex+3]
+      position = delimiterIndex + 3
       # Find next section
-      delimiterIndex = parseData.find("[")
+      delimiterIndex = parseData.find("[", position)
       # If EOF, current buffer is final section
       if delimiterIndex == -1:
         # Set thisSection's data to remaining buffer
-        thisSection.rawData = parseData
-        parseData = ""
+        thisSection.rawData = parseData[position:]
+        position = dataLength
       else:
-        # Set thisSection's data and remove it from the buffer
-        thisSection.rawData = parseData[:delimiterIndex]
-        logging.debug("set rawData of '{}' to this section".format(thisSection.rawData))
-        parseData = parseData[delimiterIndex:]
+        # Set thisSection's data and move on to the next section
+        thisSection.rawData = parseData[position:delimiterIndex]
+        logging.log(lib.config.TRACE, "set rawData of '%s' to this section", thisSection.rawData)
+        position = delimiterIndex
       # Finally parse section data
       thisSection.initSections()
       if thisSection.isParsed:
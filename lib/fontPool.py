@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+##
+# @file fontPool.py
+#
+# @brief This file keeps loaded TrueType fonts around so they can be shared
+#
+# @section description Description
+# Every Song loads its fonts and reloads them on every font size change
+# Loaded fonts are kept in a process wide pool keyed by (font path, font size),
+# so each font file is only opened once for each size
+#
+# @section notes Notes
+# - The size of the pool can be set using the 'fontPoolSize' option
+# - Pooled fonts are shared between threads, so they must only be used while holding 'fontLock'
+
+from collections import OrderedDict
+from PIL import ImageFont
+import lib.config
+import logging
+import threading
+
+# Amount of fonts kept before the least recently used ones get dropped
+DEFAULT_POOL_SIZE = 256
+# FreeType faces are not thread safe, so measuring or drawing text is serialised
+fontLock = threading.RLock()
+
+"""!@brief Class containing a bounded LRU pool of loaded fonts
+"""
+class FontPool:
+  def __init__(self, maxSize=DEFAULT_POOL_SIZE):
+    # Maximum amount of fonts
+    self.maxSize = maxSize
+    # (font path, font size) -> PIL.ImageFont.FreeTypeFont
+    self.fonts = OrderedDict()
+    # Statistics
+    self.hits = 0
+    self.misses = 0
+
+  """!@brief Returns the font for the given path and size, loading it if required
+    @param fontPath path to a TrueType font file
+    @param fontSize font size
+    @return PIL.ImageFont.FreeTypeFont object
+  """
+  def getFont(self, fontPath, fontSize):
+    key = (fontPath, fontSize)
+    with fontLock:
+      font = self.fonts.get(key)
+      if font is not None:
+        self.hits += 1
+        self.fonts.move_to_end(key)
+        return font
+      self.misses += 1
+      font = ImageFont.truetype(fontPath, fontSize)
+      self.fonts[key] = font
+      if len(self.fonts) > self.maxSize:
+        self.fonts.popitem(last=False)
+      return font
+
+# Process wide pool, shared by all Song objects
+pool = FontPool()
+
+"""!@brief (Re)creates the process wide pool using the configured size
+    @return None
+"""
+def initFontPool():
+  global pool
+  configObj = lib.config.config['options']
+  pool = FontPool(max(int(configObj['fontPoolSize']), 1))
+  logging.debug("Initialised font pool with a size of {}".format(pool.maxSize))
+
+"""!@brief Returns the font for the given path and size, loading it if required
+    @param fontPath path to a TrueType font file
+    @param fontSize font size
+    @return PIL.ImageFont.FreeTypeFont object
+"""
+def getFont(fontPath, fontSize):
+  return pool.getFont(fontPath, fontSize)
+
+"""!@brief Logs the amount of pool hits and misses
+    @return None
+"""
+def logStatistics():
+  total = pool.hits + pool.misses
+  if not total:
+    return
+  logging.info("Font pool: {} hits, {} loads ({:.1f}% hit rate), {} fonts".format(pool.hits, pool.misses, 100 * pool.hits / total, len(pool.fonts)))
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+##
+# @file fontSizeSolver.py
+#
+# @brief This file finds the largest font size which satisfies a layout constraint
+#
+# @section description Description
+# Instead of stepping the font size by one and redoing the layout each time,
+# the font size is bisected between a size known to fit and a size known not to fit
+# Requires that the constraint holds for all sizes up to the answer, like the
+# width overflow and page count constraints do
+#
+# @section notes Notes
+# - Each function returns the amount of candidate sizes it evaluated
+
+"""!@brief Bisects between a font size that fits and a font size that does not
+    @param fitsConstraint function which takes a font size and returns True if it fits
+    @param lowerBound font size which is assumed to fit
+    @param upperBound font size which is assumed to not fit
+    @return tuple of (largest font size that fits, amount of evaluated sizes)
+"""
+def findLargestFittingSize(fitsConstraint, lowerBound, upperBound):
+  evaluations = 0
+  while upperBound - lowerBound > 1:
+    candidate = (lowerBound + upperBound) // 2
+    evaluations += 1
+    if fitsConstraint(candidate):
+      lowerBound = candidate
+    else:
+      upperBound = candidate
+  return lowerBound, evaluations
+
+"""!@brief Grows the font size in increasing steps until it no longer fits, then bisects
+    @param fitsConstraint function which takes a font size and returns True if it fits
+    @param startSize font size which is assumed to fit
+    @param maxSize largest font size to consider
+    @return tuple of (largest font size that fits, amount of evaluated sizes)
+"""
+def growLargestFittingSize(fitsConstraint, startSize, maxSize):
+  evaluations = 0
+  lowerBound = startSize
+  step = 1
+  while True:
+    candidate = lowerBound + step
+    if candidate > maxSize:
+      upperBound = maxSize + 1
+      break
+    evaluations += 1
+    if not fitsConstraint(candidate):
+      upperBound = candidate
+      break
+    lowerBound = candidate
+    step *= 2
+  fontSize, bisections = findLargestFittingSize(fitsConstraint, lowerBound, upperBound)
+  return fontSize, evaluations + bisections
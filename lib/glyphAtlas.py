@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+##
+# @file glyphAtlas.py
+#
+# @brief This file renders lines of text by compositing cached glyph tiles
+#
+# @section description Description
+# Rendering text with PIL rasterizes every glyph of every line again using FreeType
+# Instead, each glyph of a (font path, font size) is rasterized once into a tile,
+# cropped to the pixels it covers. Lines are composed by pasting these tiles at
+# their pen positions into a mask, which is then drawn in the requested colour
+# Overlapping tiles are combined by taking the maximum coverage, just like FreeType
+# does when rendering a whole line, so the output is identical to ImageDraw.text
+#
+# @section notes Notes
+# - Only used for monospace fonts with a whole pixel advance width, other fonts
+#   and multiline strings are drawn using ImageDraw.text
+# - The amount of cached glyphs can be set using the 'glyphAtlasSize' option
+# - The atlas can be used from multiple threads, fonts are only used while holding the font lock
+
+from collections import OrderedDict
+from PIL import Image, ImageChops, ImageDraw
+import lib.config
+import lib.fontPool
+import lib.textMetrics
+import logging
+
+# Amount of glyph tiles kept before the least recently used ones get dropped
+DEFAULT_ATLAS_SIZE = 8192
+# Pairs which are commonly kerned. If these get kerned, glyphs can not be placed at fixed pen positions
+KERNING_PROBE = "AVAWATToLTYaFaPa"
+
+"""!@brief Class containing a bounded LRU cache of rasterized glyphs
+"""
+class GlyphAtlas:
+  def __init__(self, maxSize=DEFAULT_ATLAS_SIZE):
+    # Maximum amount of glyph tiles
+    self.maxSize = maxSize
+    # (font path, font size, character) -> (tile, x offset, y offset), or None if the glyph is blank
+    self.glyphs = OrderedDict()
+    # (font path, font size) -> advance width, or None if lines can not be composed from glyphs
+    self.advances = {}
+    # Statistics
+    self.hits = 0
+    self.misses = 0
+
+  """!@brief Returns the rasterized glyph of a character
+    @param font PIL.ImageFont.FreeTypeFont object
+    @param char single character
+    @return tuple of ('L' mode tile, x offset, y offset) relative to the pen position, None if blank
+  """
+  def getGlyph(self, font, char):
+    key = (font.path, font.size, char)
+    with lib.fontPool.fontLock:
+      if key in self.glyphs:
+        self.hits += 1
+        self.glyphs.move_to_end(key)
+        return self.glyphs[key]
+      self.misses += 1
+      glyph = None
+      left, top, right, bottom = font.getbbox(char)
+      if right > left and bottom > top:
+        tile = Image.new('L', (right - left, bottom - top))
+        ImageDraw.Draw(tile).text((-left, -top), char, fill=255, font=font)
+        inkBox = tile.getbbox()
+        if inkBox:
+          glyph = (tile.crop(inkBox), left + inkBox[0], top + inkBox[1])
+      self.glyphs[key] = glyph
+      if len(self.glyphs) > self.maxSize:
+        self.glyphs.popitem(last=False)
+      return glyph
+
+  """!@brief Returns the advance width used to place glyphs of this font
+    @param font PIL.ImageFont.FreeTypeFont object
+    @return advance width in whole pixels, or None if lines of this font can not be composed from glyphs
+  """
+  def getAdvance(self, font):
+    key = (font.path, font.size)
+    if key not in self.advances:
+      with lib.fontPool.fontLock:
+        advance = None
+        metrics = lib.textMetrics.getMonospaceMetrics(font)
+        if metrics and metrics[0].is_integer() and font.getlength(KERNING_PROBE) == metrics[0] * len(KERNING_PROBE):
+          advance = int(metrics[0])
+        else:
+          logging.info("Font '%s' at size %s can not be rendered using glyph tiles", font.path, font.size)
+        self.advances[key] = advance
+    return self.advances[key]
+
+  """!@brief Draws a line of text, like ImageDraw.text with the default anchor
+    @param draw PIL.ImageDraw.ImageDraw object
+    @param xy tuple of the top left position of the text
+    @param text string to draw
+    @param fill colour of the text
+    @param font PIL.ImageFont.FreeTypeFont object
+    @return None
+  """
+  def drawText(self, draw, xy, text, fill, font):
+    # Trailing line endings do not get drawn, anything else on a new line does
+    lineText, newline, remainder = text.partition('\n')
+    advance = self.getAdvance(font)
+    if advance is None or remainder.strip('\n'):
+      with lib.fontPool.fontLock:
+        draw.text(xy, text, fill=fill, font=font)
+      return
+    x, y = xy
+    tiles = []
+    for index, char in enumerate(lineText):
+      glyph = self.getGlyph(font, char)
+      if glyph:
+        tile, offsetX, offsetY = glyph
+        tiles.append((tile, x + index * advance + offsetX, y + offsetY))
+    if not tiles:
+      return
+    left = min(tileX for tile, tileX, tileY in tiles)
+    top = min(tileY for tile, tileX, tileY in tiles)
+    right = max(tileX + tile.size[0] for tile, tileX, tileY in tiles)
+    bottom = max(tileY + tile.size[1] for tile, tileX, tileY in tiles)
+    lineMask = Image.new('L', (right - left, bottom - top))
+    # Tiles only need to be combined if they overlap the previous ones
+    drawnRight = 0
+    for tile, tileX, tileY in tiles:
+      tileX -= left
+      tileY -= top
+      if tileX >= drawnRight:
+        lineMask.paste(tile, (tileX, tileY))
+      else:
+        box = (tileX, tileY, tileX + tile.size[0], tileY + tile.size[1])
+        lineMask.paste(ImageChops.lighter(lineMask.crop(box), tile), box)
+      drawnRight = max(drawnRight, tileX + tile.size[0])
+    draw.bitmap((left, top), lineMask, fill=fill)
+
+# Process wide atlas, shared by all renders
+atlas = GlyphAtlas()
+
+"""!@brief (Re)creates the process wide atlas using the configured size
+    @return None
+"""
+def initGlyphAtlas():
+  global atlas
+  configObj = lib.config.config['options']
+  atlas = GlyphAtlas(max(int(configObj['glyphAtlasSize']), 1))
+  logging.debug("Initialised glyph atlas with a size of %s", atlas.maxSize)
+
+"""!@brief Draws a line of text, using the glyph atlas if enabled
+    @param draw PIL.ImageDraw.ImageDraw object
+    @param xy tuple of the top left position of the text
+    @param text string to draw
+    @param fill colour of the text
+    @param font PIL.ImageFont.FreeTypeFont object
+    @return None
+"""
+def drawText(draw, xy, text, fill, font):
+  if lib.config.config['options']['useglyphatlas'] == '1':
+    atlas.drawText(draw, xy, text, fill, font)
+  else:
+    with lib.fontPool.fontLock:
+      draw.text(xy, text, fill=fill, font=font)
+
+"""!@brief Logs the amount of atlas hits and misses
+    @return None
+"""
+def logStatistics():
+  total = atlas.hits + atlas.misses
+  if not total:
+    return
+  logging.info("Glyph atlas: %s hits, %s rasterized glyphs (%.1f%% hit rate)", atlas.hits, atlas.misses, 100 * atlas.hits / total)
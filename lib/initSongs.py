@@ -7,9 +7,10 @@
 # @section description Description
 # Initializes the Song objects for each supported input file found
 # Currently only supports .txt files, which are read as-is into a string
+# Folders are walked lazily, so that songs can be processed while the rest is still being found
 #
 # @section notes Notes
-# - 
+# - Files are recognised by the extension after the last '.' of their file name
 #
 # @section todo TODO
 # - 
@@ -36,51 +37,70 @@ def initSong(filePath):
   logging.debug("Finished init for input file '{}'.\nBase output folder is '{}'\nSong title is '{}'\n".format(thisSong.inputFile, thisSong.outputLocation, thisSong.title))
   return thisSong
 
-"""!@brief Creates a list of files found in a directory and its subdirectories
-    @param root path to the root. If it is a file it returns itself
-            if it is a folder it returns its contents
-    @param depth max recursion depth, defaults to 2
-    @return list of paths to files
+"""!@brief Yields the files found in a directory and its subdirectories, as they are found
+    Uses the file type reported by the directory listing, so files are not stat'ed
+    @param root path to the root. If it is a file it yields itself
+            if it is a folder it yields its contents
+    @param depth max recursion depth
+    @return generator of (path, file name)
 """
-def walkDirectory(root, depth):
-  pathList = []
+def iterateDirectory(root, depth):
+  if not os.path.isdir(root):
+    yield root, os.path.basename(root)
+    return
   logging.debug("Walking directory '{}'".format(root))
-  def do_scan(start_dir,output,depth=2):
-      for f in os.listdir(start_dir):
-          ff = os.path.join(start_dir,f)
-          if os.path.isdir(ff):
-              if depth > 0:
-                  do_scan(ff,output,depth-1)
-          else:
-              output.append(ff)
-  do_scan(root,pathList,depth)
-  return pathList
- 
-"""!@brief Returns the list of all Song objects created
+  try:
+    with os.scandir(root) as entries:
+      for entry in entries:
+        if entry.is_dir():
+          if depth > 0:
+            yield from iterateDirectory(entry.path, depth - 1)
+        else:
+          yield entry.path, entry.name
+  except OSError as error:
+    logging.error("Unable to read directory '{}': {}".format(root, error))
+
+"""!@brief Yields the paths of all supported input files, as they are found
     This function gets all supported input files in the specified input location(s)
-    For each of these files it creates a Song object, ready to be read and then parsed
-    @param configObj configparser object
-    @return list of intialised Song objects
+    @return generator of paths to supported input files
 """
-def getSongObjects():
+def iterateSongFiles():
   # Get config variables
   configObj = lib.config.config['input']
   recursionDepth = int(configObj['maxDepth'])
-  # path to song folders, which MAY contain a .txt source file
-  txtFileLocations = []
-  # list of Song objects
-  songList = []
+  # Extensions of the supported input files
+  extensions = set()
+  if configObj['readtxt'] == '1':
+    extensions.add('txt')
+  if configObj['readraw'] == '1':
+    extensions.add('rawtxt')
   # get all files we can find, then filter on supported extensions
   for inputFolder in configObj['inputfolders'].split(','):
-    for filePath in walkDirectory(inputFolder, recursionDepth):
-      if ((filePath[filePath.find('.'):] == ".txt" ) and configObj['readtxt'] == '1') or ((filePath[filePath.find('.'):] == ".rawtxt" ) and configObj['readraw'] == '1'):
+    for filePath, fileName in iterateDirectory(inputFolder, recursionDepth):
+      if '.' in fileName and fileName[fileName.rfind('.')+1:] in extensions:
         logging.debug("Found supported file '{}'".format(filePath))
-        txtFileLocations.append(filePath)
+        yield filePath
       else:
         logging.debug("Skipping file '{}' for it is not a supported file".format(filePath))
-  # create list of Song objects
-  while(txtFileLocations):
-    filePath = txtFileLocations.pop()
-    if (filePath != ""):
-      songList.append(initSong(filePath))
-  return songList
+
+"""!@brief Returns the paths of all supported input files
+    This function gets all supported input files in the specified input location(s)
+    @return list of paths to supported input files
+"""
+def getSongFiles():
+  return list(iterateSongFiles())
+
+"""!@brief Yields a Song object for each supported input file, as soon as it is found
+    @return generator of intialised Song objects
+"""
+def iterateSongObjects():
+  for filePath in iterateSongFiles():
+    yield initSong(filePath)
+
+"""!@brief Returns the list of all Song objects created
+    This function gets all supported input files in the specified input location(s)
+    For each of these files it creates a Song object, ready to be read and then parsed
+    @return list of intialised Song objects
+"""
+def getSongObjects():
+  return list(iterateSongObjects())
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+##
+# @file layoutPlan.py
+#
+# @brief This file turns the layout of a song into an immutable, serializable plan
+#
+# @section description Description
+# Once a Song has been divided into pages, the plan records the page size, the fonts
+# and for each page the position and string of each line. Renderers draw the plan
+# without measuring any text, using the font and colour belonging to the role of each line
+#
+# Plans are cached next to the input file, keyed by the contents of the input and
+# the settings which influence the layout. Rendering again with different colours,
+# a different colour mode or another output format does not need a new layout
+#
+# @section notes Notes
+# - Caching can be turned off using the 'cacheLayoutPlans' option
+# - Each transposition of a song has its own cached plan
+
+from collections import namedtuple
+import hashlib
+import json
+import os
+import lib.buildManifest
+import lib.config
+import lib.fontPool
+import lib.textMetrics
+import logging
+
+LAYOUT_CACHE_FOLDER = ".layoutcache"
+# Increase whenever the layout or the plan format changes
+LAYOUT_PLAN_VERSION = 3
+# Output settings which only influence rendering, not the layout
+RENDER_SETTINGS = ['backgroundcolour', 'fontcolour', 'metadatacolour', 'writeheaderfile', 'pngcompresslevel',
+    'colourmode', 'dithermetadata', 'pdfembedfonts', 'svgembedfonts']
+# Roles of lines, which decide their font and colour
+ROLE_METADATA = 'metadata'
+ROLE_TABLATURE = 'tablature'
+ROLE_LYRICS = 'lyrics'
+
+# Line of text, where (x, y) is its top left position in pixels
+PlacedText = namedtuple('PlacedText', ['x', 'y', 'text', 'role'])
+# Page of a plan, number starts at 1. metadataBottom is where the metadata ends, in pixels
+PlannedPage = namedtuple('PlannedPage', ['number', 'lines', 'metadataBottom'])
+# Layout of a song. fonts is a tuple of (role, font path, font size)
+LayoutPlan = namedtuple('LayoutPlan', ['imageWidth', 'imageHeight', 'ppi', 'fonts', 'pages'])
+
+"""!@brief Lays out the lines of a single page of the song object
+    The first page also contains the metadata
+    @param songObj lib.dataStructures.Song object
+    @param page lib.dataStructures.Page object
+    @param pageNumber number of the page, starting at 1
+    @return PlannedPage object
+"""
+def planPage(songObj, page, pageNumber):
+  lines = []
+  currentHeight = songObj.verticalMargin
+
+  # Add extra whitespace on the left if this is an even page
+  # The whitespace on the right for uneven pages is handled elsewhere, by limiting the maximum horizontal size
+  horizontalMargin = songObj.horizontalMargin
+  if (pageNumber % 2) == 0:
+    horizontalMargin += songObj.extraHorizontalMargin
+
+  # Write metadata
+  if pageNumber == 1:
+    for line in songObj.metadata.split('\n'):
+      # remove any unwanted characters from metadata
+      line = line.rstrip()
+      if not line and not songObj.keepEmptyLines:
+        continue
+      logging.log(lib.config.TRACE, "Metadata '%s'", line)
+      metadataTextWidth, metadataTextHeight = lib.textMetrics.getTextSize(songObj.fontMetadata, line)
+      lines.append(PlacedText(horizontalMargin, currentHeight, line, ROLE_METADATA))
+      currentHeight += metadataTextHeight
+  metadataBottom = currentHeight
+  # Margin between metadata and the first section / section and top of page
+  currentHeight += songObj.verticalMargin
+  for section in page.sections:
+    # Reset section specific variables
+    lineIterator = 0
+    amountOfLines = len(section.lyrics)
+    # write section title
+    headerWidth, headerHeight = lib.textMetrics.getTextSize(songObj.fontTablature, section.header)
+    lines.append(PlacedText(horizontalMargin, currentHeight, section.header, ROLE_TABLATURE))
+    currentHeight += headerHeight
+    # Write each line tablature&lyric data
+    while lineIterator < amountOfLines:
+      logging.log(lib.config.TRACE, "Printing tablatures line %s and lyrics line %s", section.tablatures[lineIterator], section.lyrics[lineIterator])
+      # Get tablatures&lyric line
+      lyricTextWidth, lyricTextHeight = lib.textMetrics.getTextSize(songObj.fontLyrics, section.lyrics[lineIterator])
+      tablatureTextWidth, tablatureTextHeight = lib.textMetrics.getTextSize(songObj.fontTablature, section.tablatures[lineIterator])
+      lines.append(PlacedText(horizontalMargin, currentHeight, section.tablatures[lineIterator], ROLE_TABLATURE))
+      currentHeight += tablatureTextHeight
+      lines.append(PlacedText(horizontalMargin, currentHeight, section.lyrics[lineIterator], ROLE_LYRICS))
+      currentHeight += lyricTextHeight
+      lineIterator += 1
+      logging.log(lib.config.TRACE, "currentheight=%s", currentHeight)
+    # If we stripped al whitespace, we need to add whitespace between sections
+    if not songObj.keepEmptyLines:
+      currentHeight += songObj.verticalMargin
+  return PlannedPage(pageNumber, tuple(lines), metadataBottom)
+
+"""!@brief Creates the layout plan of a song which has been divided into pages
+    @param songObj lib.dataStructures.Song object
+    @return LayoutPlan object, or None if a section was not processed correctly
+"""
+def createLayoutPlan(songObj):
+  for page in songObj.pages:
+    for section in page.sections:
+      if (len(section.lyrics) != len(section.tablatures)):
+        logging.critical("Cannot write this section to file, since it was not processed correctly. There are %s tablature lines and %s lyric lines. Aborting...", len(section.tablatures), len(section.lyrics))
+        return None
+      if (section.expectedHeight == -1 or section.expectedWidth == -1):
+        logging.critical("Cannot write this section to file, since it was not processed correctly. The expected dimensions are not set. Aborting...")
+        return None
+  fonts = ((ROLE_METADATA, songObj.fontMetadata.path, songObj.fontMetadata.size),
+    (ROLE_TABLATURE, songObj.fontTablature.path, songObj.fontTablature.size),
+    (ROLE_LYRICS, songObj.fontLyrics.path, songObj.fontLyrics.size))
+  pages = tuple(planPage(songObj, page, pageNumber) for pageNumber, page in enumerate(songObj.pages, 1))
+  return LayoutPlan(songObj.imageWidth, songObj.imageHeight, songObj.ppi, fonts, pages)
+
+"""!@brief Returns the font of each role of a plan
+    @param plan LayoutPlan object
+    @return dict of role -> PIL.ImageFont.FreeTypeFont object
+"""
+def getFonts(plan):
+  return {role: lib.fontPool.getFont(fontPath, fontSize) for role, fontPath, fontSize in plan.fonts}
+
+"""!@brief Returns the lines of a planned page, together with their font and configured colour
+    @param plan LayoutPlan object
+    @param page PlannedPage object
+    @param songObj lib.dataStructures.Song object containing the colours
+    @return list of (x, y, text, font, RGB colour) text runs
+"""
+def getTextRuns(plan, page, songObj):
+  fonts = getFonts(plan)
+  colours = {ROLE_METADATA: songObj.metadataColour, ROLE_TABLATURE: songObj.fontColour, ROLE_LYRICS: songObj.fontColour}
+  return [(line.x, line.y, line.text, fonts[line.role], colours[line.role]) for line in page.lines]
+
+"""!@brief Converts a plan to data which can be written as JSON
+    @param plan LayoutPlan object
+    @return dict
+"""
+def planToDict(plan):
+  return {'imageWidth': plan.imageWidth, 'imageHeight': plan.imageHeight, 'ppi': plan.ppi,
+    'fonts': [list(font) for font in plan.fonts],
+    'pages': [{'number': page.number, 'metadataBottom': page.metadataBottom, 'lines': [list(line) for line in page.lines]} for page in plan.pages]}
+
+"""!@brief Converts data read from JSON back to a plan
+    @param data dict, as returned by planToDict
+    @return LayoutPlan object
+"""
+def planFromDict(data):
+  fonts = tuple(tuple(font) for font in data['fonts'])
+  pages = tuple(PlannedPage(page['number'], tuple(PlacedText(*line) for line in page['lines']), page['metadataBottom']) for page in data['pages'])
+  return LayoutPlan(data['imageWidth'], data['imageHeight'], data['ppi'], fonts, pages)
+
+"""!@brief Returns the hash of all settings which influence the layout
+    @return hex digest of the settings
+"""
+def hashLayoutSettings():
+  digest = hashlib.sha256()
+  digest.update("version={}\n".format(LAYOUT_PLAN_VERSION).encode())
+  outputConfig = lib.config.config['output']
+  for key in sorted(outputConfig):
+    if key not in RENDER_SETTINGS:
+      digest.update("{}={}\n".format(key, outputConfig[key]).encode())
+  for key in lib.buildManifest.FONT_OPTIONS:
+    fontPath = outputConfig[key]
+    if os.path.isfile(fontPath):
+      digest.update(lib.buildManifest.hashFile(fontPath).encode())
+  return digest.hexdigest()
+
+"""!@brief Class containing the cached layout plans of input files
+"""
+class PlanCache:
+  def __init__(self):
+    self.settingsHash = hashLayoutSettings()
+
+  """!@brief Returns the path of the cached plan of an input file
+    @param inputFile path to the input file
+    @param transposition amount of semitones the song is transposed by
+    @return path to the cache file
+  """
+  def getCachePath(self, inputFile, transposition=0):
+    suffix = "{:+d}".format(transposition) if transposition else ""
+    return os.path.join(os.path.dirname(inputFile), LAYOUT_CACHE_FOLDER, os.path.basename(inputFile) + suffix + ".json")
+
+  """!@brief Returns the key of the plan of an input file, based on its contents and the layout settings
+    @param inputFile path to the input file
+    @param transposition amount of semitones the song is transposed by
+    @return hex digest
+  """
+  def getKey(self, inputFile, transposition=0):
+    return hashlib.sha256((lib.buildManifest.hashFile(inputFile) + self.settingsHash + str(transposition)).encode()).hexdigest()
+
+  """!@brief Loads the cached plan of an input file
+    @param inputFile path to the input file
+    @param transposition amount of semitones the song is transposed by
+    @return LayoutPlan object, or None if there is no up to date plan
+  """
+  def load(self, inputFile, transposition=0):
+    cachePath = self.getCachePath(inputFile, transposition)
+    if not os.path.isfile(cachePath):
+      return None
+    try:
+      with open(cachePath, 'r') as file:
+        data = json.load(file)
+      if data.get('key') != self.getKey(inputFile, transposition):
+        return None
+      return planFromDict(data['plan'])
+    except (OSError, ValueError, KeyError, TypeError) as error:
+      logging.warning("Ignoring unreadable layout plan '%s': %s", cachePath, error)
+      return None
+
+  """!@brief Writes the plan of an input file to the cache
+    Writing is best effort: if the cache file can not be written, a warning is logged and the plan is not cached
+    @param inputFile path to the input file
+    @param plan LayoutPlan object
+    @param transposition amount of semitones the song is transposed by
+    @return None
+  """
+  def save(self, inputFile, plan, transposition=0):
+    cachePath = self.getCachePath(inputFile, transposition)
+    # Write to a temporary file first, so that a plan is never loaded from a partially written file
+    temporaryPath = cachePath + ".tmp"
+    try:
+      data = json.dumps({'key': self.getKey(inputFile, transposition), 'plan': planToDict(plan)}, separators=(',', ':'))
+      os.makedirs(os.path.dirname(cachePath), exist_ok=True)
+      with open(temporaryPath, 'w') as file:
+        file.write(data)
+      os.replace(temporaryPath, cachePath)
+    except OSError as error:
+      logging.warning("Could not write layout plan '%s': %s", cachePath, error)
+      try:
+        os.remove(temporaryPath)
+      except OSError:
+        pass
+
+# Process wide plan cache, None if caching is turned off
+cache = None
+
+"""!@brief (Re)creates the process wide plan cache, if enabled
+    @return None
+"""
+def initPlanCache():
+  global cache
+  cache = None
+  if lib.config.config['options']['cachelayoutplans'] == '1':
+    cache = PlanCache()
+
+"""!@brief Loads the cached plan of an input file
+    @param inputFile path to the input file
+    @param transposition amount of semitones the song is transposed by
+    @return LayoutPlan object, or None if caching is turned off or there is no up to date plan
+"""
+def loadPlan(inputFile, transposition=0):
+  if cache is None:
+    return None
+  return cache.load(inputFile, transposition)
+
+"""!@brief Writes the plan of an input file to the cache, if enabled
+    @param inputFile path to the input file
+    @param plan LayoutPlan object
+    @param transposition amount of semitones the song is transposed by
+    @return None
+"""
+def savePlan(inputFile, plan, transposition=0):
+  if cache is not None:
+    cache.save(inputFile, plan, transposition)
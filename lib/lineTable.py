@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+##
+# @file lineTable.py
+#
+# @brief This file stores per section aggregates of the line lengths of a song
+#
+# @section description Description
+# When the fonts are monospace, the layout only needs to know the length of each line.
+# A LineTable stores, for each section, the aggregates which do not depend on the font size:
+# its longest tablature and lyric line and its amount of non-empty lines. Checking a candidate
+# font size then takes a few operations per section, instead of a pass over every line of the song
+#
+# @section notes Notes
+# - Lengths include the line endings, just like when measuring the lines
+# - Each candidate font size still needs its own hinted advance width and line height,
+#   which are looked up using lib.textMetrics.getMonospaceMetrics
+# - Candidate font sizes are still evaluated one at a time by the font size solvers
+# - The monospace layout estimates line heights from a probe line, so it can pick
+#   a different font size and page division than measuring every line
+
+from array import array
+import lib.textMetrics
+
+"""!@brief Class containing the line lengths of all sections of a song
+"""
+class LineTable:
+  __slots__ = ('longestTablatures', 'longestLyrics', 'tablatureLineCounts', 'lyricLineCounts', 'longestTablature', 'longestLyric')
+
+  def __init__(self, sections):
+    # Longest header or tablature line and longest lyric line of each section
+    self.longestTablatures = array('I')
+    self.longestLyrics = array('I')
+    # Amount of non-empty header and tablature lines, and of non-empty lyric lines of each section
+    self.tablatureLineCounts = array('I')
+    self.lyricLineCounts = array('I')
+    for section in sections:
+      self.addSection(section)
+    # Longest tablature and lyric line of the song
+    self.longestTablature = max(self.longestTablatures, default=0)
+    self.longestLyric = max(self.longestLyrics, default=0)
+
+  """!@brief Appends the aggregates of a section to the table
+    Headers are drawn using the tablature font, so they count as tablature lines
+    @param section lib.dataStructures.Section object
+    @return None
+  """
+  def addSection(self, section):
+    tablatureLengths = [len(section.header)] + [len(line) for line in section.tablatures]
+    lyricLengths = [len(line) for line in section.lyrics]
+    self.longestTablatures.append(max(tablatureLengths))
+    self.longestLyrics.append(max(lyricLengths, default=0))
+    self.tablatureLineCounts.append(sum(length > 0 for length in tablatureLengths))
+    self.lyricLineCounts.append(sum(length > 0 for length in lyricLengths))
+
+"""!@brief Returns the width of the widest line of a song
+    @param table LineTable object
+    @param tablatureMetrics (advance width, line height) of the tablature font
+    @param lyricMetrics (advance width, line height) of the lyric font
+    @return width in pixels
+"""
+def getWidestLine(table, tablatureMetrics, lyricMetrics):
+  return max(lib.textMetrics.getMonospaceWidth(tablatureMetrics[0], table.longestTablature),
+      lib.textMetrics.getMonospaceWidth(lyricMetrics[0], table.longestLyric))
+
+"""!@brief Returns the heights of all sections
+    Empty lines do not take up any space, just like when measuring them
+    @param table LineTable object
+    @param tablatureMetrics (advance width, line height) of the tablature font
+    @param lyricMetrics (advance width, line height) of the lyric font
+    @return list of heights in pixels
+"""
+def getSectionHeights(table, tablatureMetrics, lyricMetrics):
+  tablatureLineHeight = tablatureMetrics[1]
+  lyricLineHeight = lyricMetrics[1]
+  return [tablatureLines * tablatureLineHeight + lyricLines * lyricLineHeight
+      for tablatureLines, lyricLines in zip(table.tablatureLineCounts, table.lyricLineCounts)]
+
+"""!@brief Returns the dimensions of all sections
+    @param table LineTable object
+    @param tablatureMetrics (advance width, line height) of the tablature font
+    @param lyricMetrics (advance width, line height) of the lyric font
+    @return list of (width, height) in pixels
+"""
+def getSectionDimensions(table, tablatureMetrics, lyricMetrics):
+  tablatureAdvance = tablatureMetrics[0]
+  lyricAdvance = lyricMetrics[0]
+  widths = [max(lib.textMetrics.getMonospaceWidth(tablatureAdvance, longestTablature),
+      lib.textMetrics.getMonospaceWidth(lyricAdvance, longestLyric))
+      for longestTablature, longestLyric in zip(table.longestTablatures, table.longestLyrics)]
+  return list(zip(widths, getSectionHeights(table, tablatureMetrics, lyricMetrics)))
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+##
+# @file pageBreaker.py
+#
+# @brief This file divides sections over pages with the least amount of badness
+#
+# @section description Description
+# Sections are placed on pages in order, each page starting where the previous one ended
+# Instead of filling each page as far as possible, all ways of breaking the sections
+# into a given amount of pages are compared using dynamic programming, like the
+# Knuth-Plass line breaker does for lines of a paragraph. The badness of a page is its
+# remaining whitespace squared, so the chosen breaks spread the whitespace over all pages
+#
+# @section notes Notes
+# - Each section is given as a tuple of (height, block height). A section fits on a page
+#   if its height fits below the current position, after which the position moves down
+#   by its block height, which also includes the header and the whitespace after it
+# - A section which does not fit on an empty page still gets a page of its own
+
+"""!@brief Checks whether a range of sections fits on a single page
+    @param sections list of (height, block height) tuples
+    @param prefixHeights list of the summed block heights before each section
+    @param start index of the first section on the page
+    @param end index after the last section on the page
+    @param pageStart height at which the first section starts
+    @param pageHeight height of the page
+    @return True if the last section fits, which implies all others do as well
+"""
+def fitsOnPage(sections, prefixHeights, start, end, pageStart, pageHeight):
+  if end - start == 1:
+    return True
+  return pageStart + prefixHeights[end - 1] - prefixHeights[start] + sections[end - 1][0] <= pageHeight
+
+"""!@brief Returns the summed block heights before each section
+    @param sections list of (height, block height) tuples
+    @return list of length len(sections) + 1
+"""
+def getPrefixHeights(sections):
+  prefixHeights = [0]
+  for height, blockHeight in sections:
+    prefixHeights.append(prefixHeights[-1] + blockHeight)
+  return prefixHeights
+
+"""!@brief Returns the least amount of pages the sections fit on, by filling each page as far as possible
+    @param sections list of (height, block height) tuples
+    @param firstPageStart height at which the first section on the first page starts
+    @param pageStart height at which the first section on other pages starts
+    @param pageHeight height of the page
+    @return amount of pages
+"""
+def countMinimumPages(sections, firstPageStart, pageStart, pageHeight):
+  if not sections:
+    return 1
+  pageAmount = 1
+  currentHeight = firstPageStart
+  isEmpty = True
+  for height, blockHeight in sections:
+    if not isEmpty and currentHeight + height > pageHeight:
+      pageAmount += 1
+      currentHeight = pageStart
+    currentHeight += blockHeight
+    isEmpty = False
+  return pageAmount
+
+"""!@brief Finds the breaks which divide the sections over an amount of pages with the least badness
+    @param sections list of (height, block height) tuples
+    @param firstPageStart height at which the first section on the first page starts
+    @param pageStart height at which the first section on other pages starts
+    @param pageHeight height of the page
+    @param pageAmount amount of pages to divide the sections over
+    @return list of the index of the first section on each page, followed by len(sections), or None if impossible
+"""
+def findPageBreaks(sections, firstPageStart, pageStart, pageHeight, pageAmount):
+  sectionAmount = len(sections)
+  if pageAmount < 1 or pageAmount > max(sectionAmount, 1):
+    return None
+  if not sections:
+    return [0, 0]
+  prefixHeights = getPrefixHeights(sections)
+  # badness[pages][end] is the least badness of placing sections[:end] on that many pages
+  # previousBreak[pages][end] is the start of the last of those pages
+  badness = [[None] * (sectionAmount + 1) for pages in range(pageAmount + 1)]
+  previousBreak = [[None] * (sectionAmount + 1) for pages in range(pageAmount + 1)]
+  badness[0][0] = 0
+  for pages in range(1, pageAmount + 1):
+    # Leave at least one section for each of the remaining pages
+    for end in range(pages, sectionAmount - (pageAmount - pages) + 1):
+      # Walk back from the shortest possible page, until the sections no longer fit
+      for start in range(end - 1, pages - 2, -1):
+        currentStart = firstPageStart if start == 0 else pageStart
+        if not fitsOnPage(sections, prefixHeights, start, end, currentStart, pageHeight):
+          break
+        if badness[pages - 1][start] is None:
+          continue
+        whitespace = pageHeight - (currentStart + prefixHeights[end] - prefixHeights[start])
+        candidate = badness[pages - 1][start] + whitespace * whitespace
+        if badness[pages][end] is None or candidate < badness[pages][end]:
+          badness[pages][end] = candidate
+          previousBreak[pages][end] = start
+  if badness[pageAmount][sectionAmount] is None:
+    return None
+  breaks = [sectionAmount]
+  end = sectionAmount
+  for pages in range(pageAmount, 0, -1):
+    end = previousBreak[pages][end]
+    breaks.append(end)
+  breaks.reverse()
+  return breaks
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+##
+# @file pdfWriter.py
+#
+# @brief This file writes multi-page PDF files, one page at a time
+#
+# @section description Description
+# Each object is written to the file as soon as it is complete, only its byte offset
+# is kept in memory. The page tree, catalog and cross reference table are written
+# when the file gets closed, so a page can be dropped as soon as it has been added
+#
+# Pages either contain a rasterized image of the page, or text drawn using the
+# TrueType fonts of the song, which get embedded once per file
+#
+# @section notes Notes
+# - Positions and sizes are passed in pixels and converted to points using the PPI
+# - Text is encoded using WinAnsiEncoding, other characters are replaced by '?'
+
+import os
+import zlib
+import lib.fontPool
+
+PDF_HEADER = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+# Points per inch of PDF user space
+POINTS_PER_INCH = 72
+# Font size at which glyph widths are measured, PDF glyph widths are in 1/1000 of the font size
+GLYPH_SPACE_SIZE = 1000
+# Character codes of WinAnsiEncoding which we include in the widths of each font
+FIRST_CHAR = 32
+LAST_CHAR = 255
+# PIL image mode -> (PDF colour space, bits per component)
+IMAGE_COLOUR_SPACES = {'RGB': (b"/DeviceRGB", 8), 'L': (b"/DeviceGray", 8), '1': (b"/DeviceGray", 1)}
+# Tags at the start of TrueType font files, which can be embedded as FontFile2
+TRUETYPE_TAGS = [b"\x00\x01\x00\x00", b"true"]
+
+"""!@brief Creates the table which escapes each byte of a PDF literal string
+    @return list of the escaped bytes for each byte value
+"""
+def createStringEscapeTable():
+  table = []
+  for byte in range(256):
+    if byte in b"()\\":
+      table.append(b"\\" + bytes([byte]))
+    elif byte < 32 or byte > 126:
+      table.append(b"\\%03o" % byte)
+    else:
+      table.append(bytes([byte]))
+  return table
+
+STRING_ESCAPE_TABLE = createStringEscapeTable()
+
+"""!@brief Converts text to a PDF literal string in WinAnsiEncoding
+    @param text string to convert
+    @return bytes of the literal string, including the parentheses
+"""
+def toPdfString(text):
+  return b"(" + b"".join(STRING_ESCAPE_TABLE[byte] for byte in text.encode('cp1252', errors='replace')) + b")"
+
+"""!@brief Formats a number for use in a PDF content stream
+    @param value int or float
+    @return bytes of the number, with at most 3 decimals
+"""
+def toPdfNumber(value):
+  return (b"%.3f" % value).rstrip(b"0").rstrip(b".")
+
+"""!@brief Converts an RGB colour to a PDF colour operand
+    @param colour tuple of (red, green, blue)
+    @return bytes of the three colour components between 0 and 1
+"""
+def toPdfColour(colour):
+  return b" ".join(toPdfNumber(component / 255) for component in colour[:3])
+
+"""!@brief Checks whether a font file can be embedded as a TrueType font
+    @param fontPath path to the font file
+    @return True if the file contains TrueType outlines
+"""
+def canEmbedFont(fontPath):
+  try:
+    with open(fontPath, 'rb') as file:
+      return file.read(4) in TRUETYPE_TAGS
+  except OSError:
+    return False
+
+"""!@brief Class which writes a PDF file, one page at a time
+"""
+class PdfWriter:
+  def __init__(self, filePath, ppi, compressLevel=6):
+    self.filePath = filePath
+    # Scale of pixels to points
+    self.scale = POINTS_PER_INCH / ppi
+    # zlib compression level of streams
+    self.compressLevel = compressLevel
+    # Object number -> byte offset, object 0 is never used
+    self.offsets = [None]
+    # Object numbers of all pages, in order
+    self.pageObjects = []
+    # font path -> (resource name, object number)
+    self.fontObjects = {}
+    self.file = open(filePath, 'wb')
+    self.file.write(PDF_HEADER)
+    # The page tree is written last, but pages need to refer to it
+    self.pagesObject = self.reserveObject()
+
+  """!@brief Reserves an object number, for an object which is written later
+    @return object number
+  """
+  def reserveObject(self):
+    self.offsets.append(None)
+    return len(self.offsets) - 1
+
+  """!@brief Writes an object with a reserved object number
+    @param number object number
+    @param body bytes of the object
+    @return object number
+  """
+  def writeObject(self, number, body):
+    self.offsets[number] = self.file.tell()
+    self.file.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    return number
+
+  """!@brief Writes an object
+    @param body bytes of the object
+    @return object number
+  """
+  def addObject(self, body):
+    return self.writeObject(self.reserveObject(), body)
+
+  """!@brief Writes a compressed stream object
+    @param dictionary bytes of the entries of the stream dictionary, other than its length and filter
+    @param data bytes of the stream
+    @return object number
+  """
+  def addStream(self, dictionary, data):
+    data = zlib.compress(data, self.compressLevel)
+    return self.addObject(b"<<" + dictionary + b" /Length %d /Filter /FlateDecode>>\nstream\n" % len(data) + data + b"\nendstream")
+
+  """!@brief Writes a page object
+    @param width width of the page in pixels
+    @param height height of the page in pixels
+    @param resources bytes of the resource dictionary
+    @param content bytes of the content stream
+    @return None
+  """
+  def addPage(self, width, height, resources, content):
+    contentObject = self.addStream(b"", content)
+    mediaBox = b"[0 0 " + toPdfNumber(width * self.scale) + b" " + toPdfNumber(height * self.scale) + b"]"
+    self.pageObjects.append(self.addObject(b"<</Type /Page /Parent %d 0 R /MediaBox " % self.pagesObject + mediaBox + b" /Resources " + resources + b" /Contents %d 0 R>>" % contentObject))
+
+  """!@brief Adds a page containing a rasterized image, scaled to the full page
+    @param image PIL.Image object in mode 'RGB', 'L' or '1'
+    @return None
+  """
+  def addImagePage(self, image):
+    width, height = image.size
+    colourSpace, bitsPerComponent = IMAGE_COLOUR_SPACES[image.mode]
+    imageObject = self.addStream(b"/Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace " % (width, height) + colourSpace + b" /BitsPerComponent %d" % bitsPerComponent, image.tobytes())
+    content = b"q " + toPdfNumber(width * self.scale) + b" 0 0 " + toPdfNumber(height * self.scale) + b" 0 0 cm /Im0 Do Q"
+    self.addPage(width, height, b"<</XObject <</Im0 %d 0 R>>>>" % imageObject, content)
+
+  """!@brief Adds a page containing text
+    @param width width of the page in pixels
+    @param height height of the page in pixels
+    @param backgroundColour RGB colour of the page
+    @param textRuns list of (x, y, text, font, RGB colour), where (x, y) is the top left of the text in pixels
+    @return None
+  """
+  def addTextPage(self, width, height, backgroundColour, textRuns):
+    # Resource name -> object number of the fonts used on this page
+    pageFonts = {}
+    content = [toPdfColour(backgroundColour) + b" rg 0 0 " + toPdfNumber(width * self.scale) + b" " + toPdfNumber(height * self.scale) + b" re f", b"BT"]
+    currentFont = None
+    currentColour = None
+    for x, y, text, font, colour in textRuns:
+      text = text.rstrip()
+      if not text:
+        continue
+      if (font.path, font.size) != currentFont:
+        resourceName, fontObject = self.getFontObject(font)
+        pageFonts[resourceName] = fontObject
+        content.append(b"/" + resourceName + b" " + toPdfNumber(font.size * self.scale) + b" Tf")
+        currentFont = (font.path, font.size)
+      if colour != currentColour:
+        content.append(toPdfColour(colour) + b" rg")
+        currentColour = colour
+      # PIL positions text by the top of its ascender, PDF by its baseline
+      with lib.fontPool.fontLock:
+        ascent, descent = font.getmetrics()
+      baseline = height - y - ascent
+      content.append(b"1 0 0 1 " + toPdfNumber(x * self.scale) + b" " + toPdfNumber(baseline * self.scale) + b" Tm " + toPdfString(text) + b" Tj")
+    content.append(b"ET")
+    fontResources = b" ".join(b"/" + name + b" %d 0 R" % number for name, number in sorted(pageFonts.items()))
+    self.addPage(width, height, b"<</Font <<" + fontResources + b">>>>", b"\n".join(content))
+
+  """!@brief Returns the font object of a font, embedding the font file the first time it is used
+    @param font PIL.ImageFont.FreeTypeFont object of a TrueType font
+    @return tuple of (resource name, object number)
+  """
+  def getFontObject(self, font):
+    if font.path in self.fontObjects:
+      return self.fontObjects[font.path]
+    with open(font.path, 'rb') as file:
+      fontData = file.read()
+    fontFileObject = self.addStream(b"/Length1 %d" % len(fontData), fontData)
+    # Measure the glyphs in PDF glyph space
+    glyphSpaceFont = lib.fontPool.getFont(font.path, GLYPH_SPACE_SIZE)
+    with lib.fontPool.fontLock:
+      ascent, descent = glyphSpaceFont.getmetrics()
+      widths = []
+      for code in range(FIRST_CHAR, LAST_CHAR + 1):
+        char = bytes([code]).decode('cp1252', errors='ignore')
+        widths.append(round(glyphSpaceFont.getlength(char)) if char else 0)
+    # Names may only contain regular characters
+    fontName = b"".join(bytes([byte]) for byte in os.path.splitext(os.path.basename(font.path))[0].encode('ascii', errors='ignore') if 33 <= byte <= 126 and byte not in b"/()<>[]{}%#")
+    # Nonsymbolic, and fixed pitch if all glyphs have the same width
+    flags = 32
+    if len(set(width for width in widths if width)) == 1:
+      flags += 1
+    descriptorObject = self.addObject(b"<</Type /FontDescriptor /FontName /" + fontName + b" /Flags %d /FontBBox [0 %d %d %d] /ItalicAngle 0 /Ascent %d /Descent %d /CapHeight %d /StemV 80 /FontFile2 %d 0 R>>" % (flags, -descent, max(widths), ascent, ascent, -descent, ascent, fontFileObject))
+    fontObject = self.addObject(b"<</Type /Font /Subtype /TrueType /BaseFont /" + fontName + b" /FirstChar %d /LastChar %d /Widths [" % (FIRST_CHAR, LAST_CHAR) + b" ".join(b"%d" % width for width in widths) + b"] /FontDescriptor %d 0 R /Encoding /WinAnsiEncoding>>" % descriptorObject)
+    resourceName = b"F%d" % (len(self.fontObjects) + 1)
+    self.fontObjects[font.path] = (resourceName, fontObject)
+    return self.fontObjects[font.path]
+
+  """!@brief Writes the page tree, catalog and cross reference table and closes the file
+    @return None
+  """
+  def close(self):
+    self.writeObject(self.pagesObject, b"<</Type /Pages /Kids [" + b" ".join(b"%d 0 R" % page for page in self.pageObjects) + b"] /Count %d>>" % len(self.pageObjects))
+    catalogObject = self.addObject(b"<</Type /Catalog /Pages %d 0 R>>" % self.pagesObject)
+    crossReferenceOffset = self.file.tell()
+    self.file.write(b"xref\n0 %d\n0000000000 65535 f \n" % len(self.offsets))
+    for offset in self.offsets[1:]:
+      self.file.write(b"%010d 00000 n \n" % offset)
+    self.file.write(b"trailer\n<</Size %d /Root %d 0 R>>\nstartxref\n%d\n%%%%EOF\n" % (len(self.offsets), catalogObject, crossReferenceOffset))
+    self.file.close()
+
+  """!@brief Closes and removes an unfinished file
+    @return None
+  """
+  def abort(self):
+    self.file.close()
+    os.remove(self.filePath)
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+##
+# @file songCache.py
+#
+# @brief This file stores parsed songs in a compact binary format, so they can be loaded without parsing
+#
+# @section description Description
+# Once an input file has been parsed, its metadata, section headers and lines are written
+# to a cache file next to it. The next time the song is needed the cache file is mapped into
+# memory and the strings are sliced out of it, instead of reading, splitting and classifying
+# each line of the input again
+#
+# A cache file consists of a header, an offset index and a single block of UTF-8 text:
+# - header: magic, format version, size and modification time of the input, hash of the parse settings,
+#   amount of strings and amount of sections
+# - index of (amount of strings + 1) character offsets of each string in the text
+# - index of (amount of sections + 1) string numbers of the first string of each section
+# - text containing the metadata, followed by the header, tablature and lyric lines of each section
+#
+# @section notes Notes
+# - A cache file is used as long as the size and modification time of its input file do not change
+# - Caching can be turned off using the 'cacheParsedSongs' option
+
+from array import array
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import lib.config
+import lib.dataStructures
+import logging
+
+SONG_CACHE_FOLDER = ".songcache"
+SONG_CACHE_MAGIC = b"GSPC"
+# Increase whenever parsing or the cache format changes
+SONG_CACHE_VERSION = 1
+# magic, version, input size, input modification time, settings hash, amount of strings, amount of sections
+HEADER_FORMAT = struct.Struct("<4sIQQ32sII")
+# Offsets are stored as little endian unsigned 32 bit integers
+OFFSET_TYPE = 'I'
+
+"""!@brief Converts an array of offsets to the byte order of the cache file
+    @param offsets array of offsets
+    @return bytes of the offsets in little endian byte order
+"""
+def offsetsToBytes(offsets):
+  if sys.byteorder != 'little':
+    offsets = array(OFFSET_TYPE, offsets)
+    offsets.byteswap()
+  return offsets.tobytes()
+
+"""!@brief Reads an array of offsets from the cache file
+    @param data buffer of the cache file
+    @param position byte offset of the first offset
+    @param amount amount of offsets
+    @return tuple of (array of offsets, byte offset after the last offset)
+"""
+def offsetsFromBytes(data, position, amount):
+  offsets = array(OFFSET_TYPE)
+  end = position + amount * offsets.itemsize
+  if end > len(data):
+    raise ValueError("cache file is truncated")
+  offsets.frombytes(data[position:end])
+  if sys.byteorder != 'little':
+    offsets.byteswap()
+  return offsets, end
+
+"""!@brief Returns the hash of all settings which influence parsing
+    @return digest of the settings
+"""
+def hashParseSettings():
+  digest = hashlib.sha256()
+  digest.update("version={}\n".format(SONG_CACHE_VERSION).encode())
+  digest.update("keepemptylines={}\n".format(lib.config.config['output']['keepemptylines']).encode())
+  return digest.digest()
+
+"""!@brief Class containing the cached parse results of input files
+"""
+class SongCache:
+  def __init__(self):
+    self.settingsHash = hashParseSettings()
+
+  """!@brief Returns the path of the cache file of an input file
+    @param inputFile path to the input file
+    @return path to the cache file
+  """
+  def getCachePath(self, inputFile):
+    return os.path.join(os.path.dirname(inputFile), SONG_CACHE_FOLDER, os.path.basename(inputFile) + ".bin")
+
+  """!@brief Fills a Song object using the cache file of its input file
+    @param songObj lib.dataStructures.Song object
+    @return True if the song was loaded, False if there is no up to date cache file
+  """
+  def load(self, songObj):
+    cachePath = self.getCachePath(songObj.inputFile)
+    try:
+      inputStat = os.stat(songObj.inputFile)
+      with open(cachePath, 'rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+          magic, version, inputSize, inputTime, settingsHash, stringAmount, sectionAmount = HEADER_FORMAT.unpack_from(data, 0)
+          if magic != SONG_CACHE_MAGIC or version != SONG_CACHE_VERSION or settingsHash != self.settingsHash:
+            return False
+          if inputSize != inputStat.st_size or inputTime != inputStat.st_mtime_ns:
+            return False
+          stringOffsets, position = offsetsFromBytes(data, HEADER_FORMAT.size, stringAmount + 1)
+          sectionOffsets, position = offsetsFromBytes(data, position, sectionAmount + 1)
+          text = str(data[position:], 'utf-8')
+    except FileNotFoundError:
+      return False
+    except (OSError, ValueError, struct.error) as error:
+      logging.warning("Ignoring unreadable song cache '%s': %s", cachePath, error)
+      return False
+    strings = [sys.intern(text[start:end]) for start, end in zip(stringOffsets, stringOffsets[1:])]
+    songObj.metadata = strings[0]
+    songObj.sections = []
+    for start, end in zip(sectionOffsets, sectionOffsets[1:]):
+      section = lib.dataStructures.Section()
+      section.header = strings[start]
+      section.tablatures = strings[start + 1:end:2]
+      section.lyrics = strings[start + 2:end:2]
+      section.isParsed = True
+      songObj.sections.append(section)
+    songObj.isParsed = True
+    return True
+
+  """!@brief Writes the parse results of a Song object to the cache file of its input file
+    Writing is best effort: if the cache file can not be written, a warning is logged and the song is not cached
+    @param songObj parsed lib.dataStructures.Song object
+    @return None
+  """
+  def save(self, songObj):
+    cachePath = self.getCachePath(songObj.inputFile)
+    inputStat = os.stat(songObj.inputFile)
+    strings = [songObj.metadata]
+    sectionOffsets = array(OFFSET_TYPE)
+    for section in songObj.sections:
+      sectionOffsets.append(len(strings))
+      strings.append(section.header)
+      for tablature, lyric in zip(section.tablatures, section.lyrics):
+        strings.append(tablature)
+        strings.append(lyric)
+    sectionOffsets.append(len(strings))
+    stringOffsets = array(OFFSET_TYPE, [0])
+    for string in strings:
+      stringOffsets.append(stringOffsets[-1] + len(string))
+    header = HEADER_FORMAT.pack(SONG_CACHE_MAGIC, SONG_CACHE_VERSION, inputStat.st_size, inputStat.st_mtime_ns,
+        self.settingsHash, len(strings), len(songObj.sections))
+    # Write to a temporary file first, so that a song is never loaded from a partially written file
+    temporaryPath = cachePath + ".tmp"
+    try:
+      os.makedirs(os.path.dirname(cachePath), exist_ok=True)
+      with open(temporaryPath, 'wb') as file:
+        file.write(header + offsetsToBytes(stringOffsets) + offsetsToBytes(sectionOffsets) + ''.join(strings).encode('utf-8'))
+      os.replace(temporaryPath, cachePath)
+    except OSError as error:
+      logging.warning("Could not write song cache '%s': %s", cachePath, error)
+      try:
+        os.remove(temporaryPath)
+      except OSError:
+        pass
+
+# Process wide song cache, None if caching is turned off
+cache = None
+
+"""!@brief (Re)creates the process wide song cache, if enabled
+    @return None
+"""
+def initSongCache():
+  global cache
+  cache = None
+  if lib.config.config['options']['cacheparsedsongs'] == '1':
+    cache = SongCache()
+
+"""!@brief Fills a Song object using the cache file of its input file
+    @param songObj lib.dataStructures.Song object
+    @return True if the song was loaded, False if caching is turned off or there is no up to date cache file
+"""
+def loadSong(songObj):
+  if cache is None:
+    return False
+  return cache.load(songObj)
+
+"""!@brief Writes the parse results of a Song object to the cache file of its input file, if enabled
+    @param songObj parsed lib.dataStructures.Song object
+    @return None
+"""
+def saveSong(songObj):
+  if cache is not None:
+    cache.save(songObj)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+##
+# @file songIndex.py
+#
+# @brief This file keeps a searchable index of all songs in an SQLite database
+#
+# @section description Description
+# For every input file the index records its title, path, modification time and size,
+# its metadata lines, section headers and the chords used in its tablature lines
+# Titles, metadata, headers and lyrics are also stored in a full text search table,
+# so songs can be found by title, lyric fragment or chord without reading the library
+#
+# @section notes Notes
+# - The index is only kept if the 'songIndex' option is set to the path of the database
+# - Songs are only indexed again when their modification time or size changes
+
+from collections import namedtuple
+import sqlite3
+import lib.transpose
+import logging
+
+# Increase whenever the schema or the indexed data changes
+SONG_INDEX_VERSION = 1
+# Amount of updated songs after which the changes are committed
+COMMIT_INTERVAL = 256
+
+SCHEMA = """
+CREATE TABLE songs (id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL, title TEXT NOT NULL, mtime INTEGER NOT NULL,
+    size INTEGER NOT NULL, metadata TEXT NOT NULL, headers TEXT NOT NULL, chords TEXT NOT NULL);
+CREATE TABLE songChords (chord TEXT NOT NULL, songId INTEGER NOT NULL, PRIMARY KEY (chord, songId)) WITHOUT ROWID;
+CREATE VIRTUAL TABLE songText USING fts5(title, metadata, headers, lyrics);
+"""
+SONG_COLUMNS = "songs.path, songs.title, songs.mtime, songs.size, songs.metadata, songs.headers, songs.chords"
+
+# Song as stored in the index. metadata, headers and chords are tuples of strings
+IndexedSong = namedtuple('IndexedSong', ['path', 'title', 'mtime', 'size', 'metadata', 'headers', 'chords'])
+# Fields of a parsed song which get indexed. Only holds strings, so it can be sent back by a worker process
+SongEntry = namedtuple('SongEntry', ['path', 'title', 'metadata', 'headers', 'lyrics', 'chords'])
+
+"""!@brief Collects the fields of a parsed song which get indexed
+    @param songObj parsed lib.dataStructures.Song object
+    @return SongEntry object, of which metadata, headers and lyrics are newline separated and chords is a list of strings
+"""
+def createSongEntry(songObj):
+  metadata = '\n'.join(line.strip() for line in songObj.metadata.splitlines() if line.strip())
+  headers = '\n'.join(section.header.strip() for section in songObj.sections)
+  lyrics = '\n'.join(line.rstrip() for section in songObj.sections for line in section.lyrics if line.strip())
+  return SongEntry(songObj.inputFile, songObj.title, metadata, headers, lyrics, lib.transpose.getSongChords(songObj))
+
+"""!@brief Converts a row of the songs table to an IndexedSong
+    @param row tuple of the SONG_COLUMNS
+    @return IndexedSong object
+"""
+def rowToSong(row):
+  path, title, mtime, size, metadata, headers, chords = row
+  return IndexedSong(path, title, mtime, size, tuple(metadata.splitlines()), tuple(headers.splitlines()), tuple(chords.split()))
+
+"""!@brief Class containing the connection to the song index
+"""
+class SongIndex:
+  def __init__(self, databasePath):
+    self.databasePath = databasePath
+    self.connection = sqlite3.connect(databasePath)
+    self.connection.execute("PRAGMA synchronous = NORMAL")
+    # Amount of updates which have not been committed yet
+    self.pendingUpdates = 0
+    if self.connection.execute("PRAGMA user_version").fetchone()[0] != SONG_INDEX_VERSION:
+      self.createSchema()
+
+  """!@brief Drops any tables of an older version and creates the tables of the index
+    @return None
+  """
+  def createSchema(self):
+    logging.info("Creating song index '%s'", self.databasePath)
+    with self.connection:
+      for table in ['songs', 'songChords', 'songText']:
+        self.connection.execute("DROP TABLE IF EXISTS " + table)
+    self.connection.executescript(SCHEMA)
+    self.connection.execute("PRAGMA user_version = {}".format(SONG_INDEX_VERSION))
+    self.connection.commit()
+
+  """!@brief Checks whether an input file has changed since it was indexed
+    @param inputFile path to the input file
+    @param mtime modification time of the input file in nanoseconds
+    @param size size of the input file in bytes
+    @return True if the input file is not indexed or has changed
+  """
+  def needsUpdate(self, inputFile, mtime, size):
+    row = self.connection.execute("SELECT mtime, size FROM songs WHERE path = ?", (inputFile,)).fetchone()
+    return row != (mtime, size)
+
+  """!@brief Adds a parsed song to the index, replacing a previous version
+    @param songObj parsed lib.dataStructures.Song object
+    @param mtime modification time of the input file in nanoseconds
+    @param size size of the input file in bytes
+    @return None
+  """
+  def update(self, songObj, mtime, size):
+    self.updateEntry(createSongEntry(songObj), mtime, size)
+
+  """!@brief Adds the indexed fields of a song to the index, replacing a previous version
+    @param entry SongEntry object, as returned by createSongEntry
+    @param mtime modification time of the input file in nanoseconds
+    @param size size of the input file in bytes
+    @return None
+  """
+  def updateEntry(self, entry, mtime, size):
+    self.remove(entry.path)
+    songId = self.connection.execute("INSERT INTO songs (path, title, mtime, size, metadata, headers, chords) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (entry.path, entry.title, mtime, size, entry.metadata, entry.headers, ' '.join(entry.chords))).lastrowid
+    self.connection.executemany("INSERT INTO songChords (chord, songId) VALUES (?, ?)", ((chord, songId) for chord in entry.chords))
+    self.connection.execute("INSERT INTO songText (rowid, title, metadata, headers, lyrics) VALUES (?, ?, ?, ?, ?)",
+        (songId, entry.title, entry.metadata, entry.headers, entry.lyrics))
+    self.pendingUpdates += 1
+    if self.pendingUpdates >= COMMIT_INTERVAL:
+      self.commit()
+
+  """!@brief Removes an input file from the index
+    @param inputFile path to the input file
+    @return None
+  """
+  def remove(self, inputFile):
+    row = self.connection.execute("SELECT id FROM songs WHERE path = ?", (inputFile,)).fetchone()
+    if row is None:
+      return
+    self.connection.execute("DELETE FROM songChords WHERE songId = ?", row)
+    self.connection.execute("DELETE FROM songText WHERE rowid = ?", row)
+    self.connection.execute("DELETE FROM songs WHERE id = ?", row)
+
+  """!@brief Removes all songs which are not in the given input files
+    @param inputFiles set of paths to all input files which were found
+    @return amount of removed songs
+  """
+  def removeMissing(self, inputFiles):
+    missingFiles = [path for (path,) in self.connection.execute("SELECT path FROM songs") if path not in inputFiles]
+    for inputFile in missingFiles:
+      self.remove(inputFile)
+    return len(missingFiles)
+
+  """!@brief Commits all pending changes
+    @return None
+  """
+  def commit(self):
+    self.connection.commit()
+    self.pendingUpdates = 0
+
+  """!@brief Commits all pending changes and closes the database
+    @return None
+  """
+  def close(self):
+    self.commit()
+    self.connection.close()
+
+  """!@brief Finds songs of which the title contains the given text, ignoring case
+    @param text part of the title
+    @return list of IndexedSong objects, ordered by title
+  """
+  def findByTitle(self, text):
+    pattern = '%' + text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    return [rowToSong(row) for row in self.connection.execute("SELECT " + SONG_COLUMNS + " FROM songs WHERE title LIKE ? ESCAPE '\\' ORDER BY title", (pattern,))]
+
+  """!@brief Finds songs of which the lyrics contain the given words in this order
+    @param fragment words of the lyrics
+    @return list of IndexedSong objects, best matches first
+  """
+  def findByLyrics(self, fragment):
+    return self.matchText('lyrics : "' + fragment.replace('"', '""') + '"')
+
+  """!@brief Finds songs of which the tablature lines contain the given chord
+    @param chord chord as written in the tablature, like 'Am7' or 'D/F#'
+    @return list of IndexedSong objects, ordered by title
+  """
+  def findByChord(self, chord):
+    return [rowToSong(row) for row in self.connection.execute("SELECT " + SONG_COLUMNS + " FROM songChords JOIN songs ON songs.id = songChords.songId WHERE songChords.chord = ? ORDER BY songs.title", (chord,))]
+
+  """!@brief Finds songs using a full text query on their title, metadata, headers and lyrics
+    @param query SQLite FTS5 query, like 'hotel AND california' or 'title : hotel'
+    @return list of IndexedSong objects, best matches first
+  """
+  def matchText(self, query):
+    return [rowToSong(row) for row in self.connection.execute("SELECT " + SONG_COLUMNS + " FROM songText JOIN songs ON songs.id = songText.rowid WHERE songText MATCH ? ORDER BY songText.rank", (query,))]
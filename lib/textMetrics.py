@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+##
+# @file textMetrics.py
+#
+# @brief This file caches the rendered dimensions of text for a given font
+#
+# @section description Description
+# Every layout pass measures the same headers, lyric and tablature lines again
+# for each font size we try. Measurements are stored in a bounded LRU cache
+# keyed by (font path, font size, string), shared by the layout and the renderers
+#
+# For monospace fonts the advance width and line height are determined once per
+# font size, so that lines can be measured by their length alone
+#
+# @section notes Notes
+# - The size of the cache can be set using the 'metricsCacheSize' option
+# - The cache can be used from multiple threads, fonts are only measured while holding the font lock
+
+from collections import OrderedDict
+import math
+import string
+import lib.config
+import lib.fontPool
+import logging
+
+# Amount of measurements kept before the least recently used ones get dropped
+DEFAULT_CACHE_SIZE = 65536
+# Characters which should all have the same advance width in a monospace font
+MONOSPACE_PROBE_CHARACTERS = "iMW .1#/[]"
+# Line used to determine the height of a line of text, covering all ASCII glyphs
+LINE_HEIGHT_PROBE = string.ascii_letters + string.digits + string.punctuation + " \r\n"
+
+"""!@brief Class containing a bounded LRU cache of text dimensions
+"""
+class MetricsCache:
+  def __init__(self, maxSize=DEFAULT_CACHE_SIZE):
+    # Maximum amount of entries
+    self.maxSize = maxSize
+    # (font path, font size, string) -> (width, height)
+    self.entries = OrderedDict()
+    # Statistics
+    self.hits = 0
+    self.misses = 0
+
+  """!@brief Returns the dimensions of the text when rendered with the given font
+    @param font PIL.ImageFont.FreeTypeFont object
+    @param text string to measure
+    @return tuple of (width, height)
+  """
+  def getsize(self, font, text):
+    key = (font.path, font.size, text)
+    with lib.fontPool.fontLock:
+      dimensions = self.entries.get(key)
+      if dimensions is not None:
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return dimensions
+      self.misses += 1
+      dimensions = font.getsize(text)
+      self.entries[key] = dimensions
+      if len(self.entries) > self.maxSize:
+        self.entries.popitem(last=False)
+      return dimensions
+
+  """!@brief Drops all cached entries and resets the statistics
+    @return None
+  """
+  def clear(self):
+    self.entries.clear()
+    self.hits = 0
+    self.misses = 0
+
+# Process wide cache, shared by all Song objects and renderers
+cache = MetricsCache()
+# (font path, font size) -> (advance width, line height), or None if not monospace
+monospaceMetrics = {}
+
+"""!@brief (Re)creates the process wide cache using the configured size
+    @return None
+"""
+def initMetricsCache():
+  global cache
+  configObj = lib.config.config['options']
+  cache = MetricsCache(max(int(configObj['metricsCacheSize']), 1))
+  logging.debug("Initialised text metrics cache with a size of {}".format(cache.maxSize))
+
+"""!@brief Returns the dimensions of the text when rendered with the given font
+    @param font PIL.ImageFont.FreeTypeFont object
+    @param text string to measure
+    @return tuple of (width, height)
+"""
+def getTextSize(font, text):
+  return cache.getsize(font, text)
+
+"""!@brief Returns the advance width and line height of a monospace font
+    The result is determined once for each font path and font size
+    @param font PIL.ImageFont.FreeTypeFont object
+    @return tuple of (advance width, line height), or None if the font is not monospace
+"""
+def getMonospaceMetrics(font):
+  key = (font.path, font.size)
+  if key in monospaceMetrics:
+    return monospaceMetrics[key]
+  with lib.fontPool.fontLock:
+    advances = set(font.getlength(char) for char in MONOSPACE_PROBE_CHARACTERS)
+    if len(advances) != 1:
+      logging.info("Font '{}' is not monospace, falling back to measuring each line".format(font.path))
+      monospaceMetrics[key] = None
+      return None
+    lineWidth, lineHeight = font.getsize(LINE_HEIGHT_PROBE)
+    monospaceMetrics[key] = (advances.pop(), lineHeight)
+  return monospaceMetrics[key]
+
+"""!@brief Returns the width of a line of text in a monospace font
+    @param advance advance width of a single character
+    @param length amount of characters
+    @return width in pixels
+"""
+def getMonospaceWidth(advance, length):
+  return int(math.ceil(advance * length))
+
+"""!@brief Logs the amount of cache hits and misses
+    @return None
+"""
+def logStatistics():
+  total = cache.hits + cache.misses
+  if not total:
+    return
+  logging.info("Text metrics cache: {} hits, {} misses ({:.1f}% hit rate), {} entries".format(cache.hits, cache.misses, 100 * cache.hits / total, len(cache.entries)))
@@ -5,17 +5,218 @@
 # @brief This file takes a string corresponding to chord data and transposes it
 #
 # @section description Description
-# -
+# Each chord in a tablature line is split into its root, quality and bass note. The root and
+# bass note are looked up in a precomputed table of note indices, moved by the amount of
+# semitones and spelled again using sharps or flats. Lyric lines and other text stay as they are
 #
-# @section notes Notes
-# - 
+# A section is transposed in one pass: the distinct chords of all its tablature lines are
+# transposed once, after which each line is rewritten using that mapping
 #
-# @section todo TODO
-# - take a line of chord data, for each string enclosed in whitespace or tabs:
-#     ignore if its in major or minor, just take the ROOT of the chord
-#     then get its index in the slider
-#     then add/subtract transposition amount and loop around the slider if it goes over
-#     make sure to keep line width persistent:
-#     if from E to Eb for example, remove a whitespace
-#     if from Eb to D for example, add a whitespace
-slider = ['E', 'F', 'Gb', 'G', 'Ab', 'A', 'Bb', 'B', 'C', 'Db', 'D', 'Eb']
\ No newline at end of file
+# @section notes Notes
+# - Line width is kept persistent, so chords stay above the lyrics they belong to:
+#     if from E to Eb for example, a whitespace after the chord is removed
+#     if from Eb to D for example, a whitespace after the chord is added
+#   At least one whitespace is kept between chords, so a line may still get wider
+# - The keys to render are set using the 'transpose' option, the spelling using 'chordSpelling'
+# - With the 'auto' spelling, sharps or flats are picked once per song, from the key implied by its first chord
+
+import re
+import lib.config
+import lib.dataStructures
+import logging
+
+slider = ['E', 'F', 'Gb', 'G', 'Ab', 'A', 'Bb', 'B', 'C', 'Db', 'D', 'Eb']
+
+"""!@brief Creates the spelling of each note of the slider using sharps instead of flats
+    @return list of note names, in the same order as the slider
+"""
+def createSharpSlider():
+  letters = "ABCDEFG"
+  return [letters[letters.index(note[0]) - 1] + '#' if note.endswith('b') else note for note in slider]
+
+SHARP_SLIDER = createSharpSlider()
+# Spelling -> note names in the order of the slider
+SPELLINGS = {'flat': slider, 'sharp': SHARP_SLIDER}
+# Note name -> index in the slider, including enharmonic spellings such as E# and Cb
+NOTE_INDEX = dict([(note, index) for index, note in enumerate(slider)] + [(note, index) for index, note in enumerate(SHARP_SLIDER)]
+    + [('E#', slider.index('F')), ('B#', slider.index('C')), ('Fb', slider.index('E')), ('Cb', slider.index('B'))])
+# Major keys which are written using flats, all other keys are written using sharps
+FLAT_KEYS = set(NOTE_INDEX[note] for note in ['C', 'F', 'Bb', 'Eb', 'Ab', 'Db'])
+# A chord: root, optional accidental, quality and extensions, optional bass note
+CHORD_PATTERN = re.compile(r"(?P<root>[A-G][#b]?)(?P<quality>(?:maj|min|dim|aug|sus|add|m|M|\+)?[0-9]*(?:(?:maj|sus|add|b|#)[0-9]+)*)(?:/(?P<bass>[A-G][#b]?))?")
+# Characters around a chord which are not part of it, like in '(Am)' or '|C'
+CHORD_SURROUNDING_CHARACTERS = "()[]{}|,*"
+# Splits a line into alternating words and whitespace
+WORD_PATTERN = re.compile(r"(\S+)")
+# Amount of semitones of all 12 keys, from 5 down to 6 up
+ALL_KEYS = list(range(-5, 7))
+
+"""!@brief Splits a chord into its root, quality and bass note
+    @param chord string of a single chord, like 'C#m7/G#'
+    @return tuple of (root, quality, bass note or None), or None if it is not a chord
+"""
+def parseChord(chord):
+  match = CHORD_PATTERN.fullmatch(chord)
+  if not match:
+    return None
+  return match.group('root'), match.group('quality'), match.group('bass')
+
+"""!@brief Returns the distinct chords in the tablature lines of a song, in order of appearance
+    @param songObj parsed lib.dataStructures.Song object
+    @return list of chord strings
+"""
+def getSongChords(songObj):
+  chords = {}
+  for section in songObj.sections:
+    for line in section.tablatures:
+      for word in line.split():
+        word = word.strip(CHORD_SURROUNDING_CHARACTERS)
+        if parseChord(word):
+          chords[word] = True
+  return list(chords)
+
+"""!@brief Returns the spelling to use for all chords of a transposed song
+    For the 'auto' spelling, the first chord of the song is taken as its key. Minor chords
+    imply their relative major key. Flats are used if that key is written using flats once transposed
+    @param songObj parsed lib.dataStructures.Song object
+    @param semitones amount of semitones to move up, or down if negative
+    @param spelling 'sharp', 'flat' or 'auto'
+    @return 'sharp' or 'flat'
+"""
+def getSongSpelling(songObj, semitones, spelling):
+  if spelling != 'auto':
+    return spelling
+  chords = getSongChords(songObj)
+  if not chords:
+    return 'sharp'
+  root, quality, bass = parseChord(chords[0])
+  key = NOTE_INDEX[root] + semitones
+  if quality.startswith('m') and not quality.startswith('maj'):
+    key += 3
+  return 'flat' if key % len(slider) in FLAT_KEYS else 'sharp'
+
+"""!@brief Moves a note by an amount of semitones
+    @param note name of the note, like 'F#'
+    @param semitones amount of semitones to move up, or down if negative
+    @param spelling 'sharp' or 'flat'
+    @return name of the moved note
+"""
+def transposeNote(note, semitones, spelling):
+  return SPELLINGS[spelling][(NOTE_INDEX[note] + semitones) % len(slider)]
+
+"""!@brief Moves a chord by an amount of semitones
+    Characters around the chord, like brackets, are kept
+    @param word string of a single word of a tablature line
+    @param semitones amount of semitones to move up, or down if negative
+    @param spelling 'sharp' or 'flat'
+    @return transposed word, or the word itself if it is not a chord
+"""
+def transposeChord(word, semitones, spelling):
+  chord = word.strip(CHORD_SURROUNDING_CHARACTERS)
+  parsedChord = parseChord(chord) if chord else None
+  if parsedChord is None:
+    return word
+  root, quality, bass = parsedChord
+  transposedChord = transposeNote(root, semitones, spelling) + quality
+  if bass:
+    transposedChord += '/' + transposeNote(bass, semitones, spelling)
+  start = word.index(chord)
+  return word[:start] + transposedChord + word[start + len(chord):]
+
+"""!@brief Rewrites a tablature line using a mapping of words, keeping the chords in their columns
+    @param line string of a tablature line, including its line ending
+    @param wordMapping dict of word -> transposed word
+    @return transposed line
+"""
+def transposeLine(line, wordMapping):
+  content = line.rstrip('\r\n')
+  lineEnding = line[len(content):]
+  parts = WORD_PATTERN.split(content)
+  # Amount of characters the line has grown so far
+  growth = 0
+  for index in range(1, len(parts), 2):
+    word = parts[index]
+    transposedWord = wordMapping.get(word, word)
+    parts[index] = transposedWord
+    growth += len(transposedWord) - len(word)
+    whitespace = parts[index + 1]
+    # Trailing whitespace is left alone, only whitespace between words is adjusted
+    if not growth or index + 2 >= len(parts):
+      continue
+    if growth > 0:
+      removed = min(growth, len(whitespace) - 1)
+      parts[index + 1] = whitespace[removed:]
+      growth -= removed
+    else:
+      parts[index + 1] = whitespace + ' ' * -growth
+      growth = 0
+  return ''.join(parts) + lineEnding
+
+"""!@brief Transposes all chords of a section
+    The distinct words of all tablature lines are transposed once, then each line is rewritten
+    @param section parsed lib.dataStructures.Section object
+    @param semitones amount of semitones to move up, or down if negative
+    @param spelling 'sharp' or 'flat', used for every chord of the section
+    @return new lib.dataStructures.Section object, sharing the header and lyrics of the original
+"""
+def transposeSection(section, semitones, spelling):
+  words = set()
+  for line in section.tablatures:
+    words.update(line.split())
+  wordMapping = {word: transposeChord(word, semitones, spelling) for word in words}
+  transposedSection = lib.dataStructures.Section()
+  transposedSection.header = section.header
+  transposedSection.lyrics = section.lyrics
+  transposedSection.tablatures = [transposeLine(line, wordMapping) for line in section.tablatures]
+  transposedSection.isParsed = section.isParsed
+  return transposedSection
+
+"""!@brief Creates a transposed copy of a parsed song
+    The copy gets its own output location and title, with the amount of semitones appended
+    The spelling is picked once, so the same note is spelled the same way in all chords
+    @param songObj parsed lib.dataStructures.Song object
+    @param semitones amount of semitones to move up, or down if negative
+    @param spelling 'sharp', 'flat' or 'auto'
+    @return new lib.dataStructures.Song object, which still needs to be laid out
+"""
+def transposeSong(songObj, semitones, spelling='auto'):
+  spelling = getSongSpelling(songObj, semitones, spelling)
+  transposedSong = songObj.copy()
+  suffix = "{:+d}".format(semitones)
+  transposedSong.outputLocation = songObj.outputLocation + suffix
+  transposedSong.title = songObj.title + suffix
+  transposedSong.transposition = songObj.transposition + semitones
+  transposedSong.sections = [transposeSection(section, semitones, spelling) for section in songObj.sections]
+  transposedSong.pages = []
+  transposedSong.layoutPlan = None
+  transposedSong.lineTable = None
+  return transposedSong
+
+"""!@brief Returns the configured spelling of transposed notes
+    @return 'sharp', 'flat' or 'auto'
+"""
+def getChordSpelling():
+  spelling = lib.config.config['output']['chordSpelling'].strip().lower()
+  if spelling != 'auto' and spelling not in SPELLINGS:
+    logging.warning("Unknown chordSpelling '%s', using 'auto' instead", spelling)
+    return 'auto'
+  return spelling
+
+"""!@brief Returns the amounts of semitones of each key the songs should be rendered in
+    The 'transpose' option is a comma separated list of amounts, or 'all' for all 12 keys
+    @return list of amounts of semitones, 0 being the original key
+    @exception ValueError if the option is not a valid list of amounts
+"""
+def getTranspositions():
+  value = lib.config.config['options']['transpose'].strip()
+  if value.lower() == 'all':
+    return ALL_KEYS
+  transpositions = []
+  for amount in value.split(','):
+    try:
+      amount = int(amount)
+    except ValueError:
+      raise ValueError("expected 'all' or a comma separated list of semitones like '0,2,-3', got '{}'".format(value)) from None
+    if amount not in transpositions:
+      transpositions.append(amount)
+  return transpositions
@@ -7,106 +7,607 @@
 # @section description Description
 # Creates Song objects of all tablatures it can find in a given directory or its subdirectories
 # Supported inputs currently: Any .txt file, as long as each section has a corresponding [<sectionName>] delimiter
-# Supported outputs currently: PNG format
+# Supported outputs currently: PNG, PDF, SVG and TXT format
 # Song objects are then parsed into separate metadata information and sections
 # Sections contain lines of lyric and corresponding tablature data
 # The program then tries to fit these sections within the chosen output dimensions (currently A4)
 #   as best as it can, shrinking or growing sections to fit the remaining space
 #
 # @section notes Notes
-# - 
+# - Run with '--jobs N' to process N songs at the same time, each in its own process
+# - Songs which did not change since the last build are skipped, run with '--force' to rebuild them
+# - Run with '--watch' to keep running and rebuild songs as soon as they are added or modified
+# - Set the 'combinedPdf' option to a path to also write all songs to a single PDF
+# - Set the 'bulkTxt' option to a path to also write the text of all songs to a single file
+# - Set the 'songIndex' option to a path to keep a searchable index of all songs, which can
+#   be queried using '--find-title', '--find-lyrics' and '--find-chord'
 
 import lib.chordFinder
 import lib.dataStructures
 import lib.initSongs
 import lib.transpose
 import lib.config
+import lib.textMetrics
+import lib.fontPool
+import lib.buildManifest
+import lib.glyphAtlas
+import lib.layoutPlan
+import lib.songCache
+import lib.songIndex
 import output2img
+import output2pdf
+import output2svg
 import output2txt
+import argparse
+import concurrent.futures
 import logging
+import os
+import time
 
-def main():
-  # Init config file
-  lib.config.initConfig()
-  # Init Song objects for all songs with compatible inputs
-  songs = lib.initSongs.getSongObjects()
-  # Get what programs we are going to run
-  configObj = lib.config.config['options']
-  exportToImg = configObj['exporttoimg'] == '1'
-  exportToTxt = configObj['exporttotxt'] == '1'
-  exportToRaw = configObj['exporttoraw'] == '1'
+"""!@brief Keeps the log records of a single song, so they can be written out together
+"""
+class SongLogHandler(logging.Handler):
+  def __init__(self):
+    super().__init__()
+    self.records = []
+
+  def emit(self, record):
+    # Format messages and exceptions now, so that the record can be sent to the main process
+    if record.exc_info:
+      record.exc_text = logging.Formatter().formatException(record.exc_info)
+      record.exc_info = None
+    record.msg = record.getMessage()
+    record.args = None
+    self.records.append(record)
 
-  logLevel = int(configObj['loglevel'])
+"""!@brief Converts the logLevel option to a logging level
+    Level 5 logs debug info, level 6 also traces every parsed, measured and rendered line
+    @return logging level
+"""
+def getLogLevel():
+  logLevel = int(lib.config.config['options']['loglevel'])
   if logLevel == 1:
-    logLevel = logging.CRITICAL
+    return logging.CRITICAL
   elif logLevel == 2:
-    logLevel = logging.ERROR
+    return logging.ERROR
   elif logLevel == 3:
-    logLevel = logging.WARNING
+    return logging.WARNING
   elif logLevel == 4:
-    logLevel = logging.INFO
+    return logging.INFO
+  elif logLevel >= 6:
+    return lib.config.TRACE
+  return logging.DEBUG
+
+"""!@brief Parses the input of a single song into sections, or loads it if the cached song is up to date
+    @param song lib.dataStructures.Song object
+    @return True if the song was parsed, False if it should be skipped
+"""
+def parseSong(song):
+  if lib.songCache.loadSong(song):
+    logging.info("Using the cached sections of song '{}'".format(song.title))
+    return True
+  logging.info("Start parsing song '{}'...".format(song.title)) 
+  # Initialise internal data structures
+  logging.debug("song file extension {}".format(song.fileExtension))
+  if song.fileExtension == 'txt':
+    song.initSections()
+  elif song.fileExtension == 'rawtxt':
+    song.initPreprocessed()
   else:
-    logLevel = logging.DEBUG
+    logging.warning("File extension '{}' not supported. Skipping...".format(song.fileExtension))
+    return False
+  # If input is .raw output. If output to raw is set, overwrite itself
+  # ready quickly using rules
+  if not song.isParsed:
+    logging.error("Song was not initialized correctly. Skipping...")
+    return False
+  lib.songCache.saveSong(song)
+  return True
 
-  logging.basicConfig()
+"""!@brief Divides the sections of a parsed song into pages, sizing the fonts to fill them
+    @param song lib.dataStructures.Song object
+    @return None
+"""
+def layoutSong(song):
+  # Fit all sections on each page, resizes down if it does not fit on width
+  song.fitSectionsByWidth()
+  # Prerender: calculate Pages, and move sections into Pages
+  song.sectionsToPages()
+  song.decreaseToMaxPages()
+  # Optimalisation: try to fit on fewer pages
+  song.shrinkToFewerPages()
+  # Optimalisation: increase font size to fit target page amount
+  song.increaseToMinPages()
+
+"""!@brief Creates the layout plan of a parsed song, or loads it if the cached plan is up to date
+    @param song lib.dataStructures.Song object
+    @return None
+"""
+def planSong(song):
+  song.layoutPlan = lib.layoutPlan.loadPlan(song.inputFile, song.transposition)
+  if song.layoutPlan is not None:
+    logging.info("Using the cached layout of song '{}'".format(song.title))
+    return
+  # The chord appendix is only added to the sections which are laid out, not to the song itself
+  laidOutSong = lib.chordFinder.addChordAppendix(song)
+  layoutSong(laidOutSong)
+  song.layoutPlan = lib.layoutPlan.createLayoutPlan(laidOutSong)
+  if song.layoutPlan is not None:
+    lib.layoutPlan.savePlan(song.inputFile, song.layoutPlan, song.transposition)
+
+"""!@brief Lays out and exports a single parsed song
+    @param song lib.dataStructures.Song object
+    @return list of paths to the files which were written
+"""
+def exportSong(song):
+  # Get what programs we are going to run
+  configObj = lib.config.config['options']
+  exportToImg = configObj['exporttoimg'] == '1'
+  exportToTxt = configObj['exporttotxt'] == '1'
+  exportToRaw = configObj['exporttoraw'] == '1'
+  exportToPdf = configObj['exporttopdf'] == '1'
+  exportToSvg = configObj['exporttosvg'] == '1'
+
+  writtenFiles = []
+
+  if exportToTxt:
+    # Create subdirectory where we will output our images
+    targetDirectory = song.outputLocation + "-txt"
+    logging.info("Successfully parsed file. Writing output to '{}'\n".format(targetDirectory)) 
+    # Write out metadata and sections, as many as can fit on one page
+    writtenFiles += output2txt.outputToTxt(targetDirectory, False, song)
+  if exportToRaw:
+    # Create subdirectory where we will output our images
+    targetDirectory = song.outputLocation + "-txt"
+    logging.info("Successfully parsed file. Writing output to '{}'\n".format(targetDirectory)) 
+    # Write out metadata and sections, as many as can fit on one page
+    writtenFiles += output2txt.outputToTxt(targetDirectory, True, song)
+  if exportToImg or exportToPdf or exportToSvg:
+    planSong(song)
+  if exportToImg:
+    # Parse as PNG a4
+    # Create subdirectory where we will output our images
+    targetDirectory = song.outputLocation + "-a4-png"
+    logging.info("Successfully parsed file. Writing output to '{}'\n".format(targetDirectory)) 
+    # Write out metadata and sections, as many as can fit on one page
+    writtenFiles += output2img.outputToImage(targetDirectory, song)
+  if exportToPdf:
+    # Create subdirectory where we will output our PDF
+    targetDirectory = song.outputLocation + "-pdf"
+    logging.info("Successfully parsed file. Writing output to '{}'\n".format(targetDirectory)) 
+    # Write out all pages to a single file
+    writtenFiles += output2pdf.outputToPdf(targetDirectory, song)
+  if exportToSvg:
+    # Create subdirectory where we will output our vector images
+    targetDirectory = song.outputLocation + "-svg"
+    logging.info("Successfully parsed file. Writing output to '{}'\n".format(targetDirectory)) 
+    # Write out metadata and sections, as many as can fit on one page
+    writtenFiles += output2svg.outputToSvg(targetDirectory, song)
+  if logging.root.isEnabledFor(logging.INFO):
+    logging.info("Song '{}' takes {:.1f} KiB of memory".format(song.title, song.getMemoryUsage() / 1024))
+  return writtenFiles
+
+"""!@brief Parses a single song and exports it in each configured key
+    The song is parsed once, each transposition is a copy of the parsed song
+    @param song lib.dataStructures.Song object
+    @return list of paths to the files which were written, None if the song was skipped
+"""
+def processSong(song):
+  if not parseSong(song):
+    return None
+  spelling = lib.transpose.getChordSpelling()
+  writtenFiles = []
+  for semitones in lib.transpose.getTranspositions():
+    if semitones == 0:
+      writtenFiles += exportSong(song)
+    else:
+      logging.info("Transposing song '{}' by {:+d} semitones".format(song.title, semitones))
+      writtenFiles += exportSong(lib.transpose.transposeSong(song, semitones, spelling))
+  return writtenFiles
+
+"""!@brief Processes a single song, without letting an exception stop the other songs
+    @param song lib.dataStructures.Song object
+    @return list of paths to the files which were written, None if the song was skipped or failed
+"""
+def tryProcessSong(song):
+  try:
+    return processSong(song)
+  except Exception:
+    logging.exception("Failed to process song '{}'".format(song.title))
+    return None
+
+"""!@brief Sets up a worker process of the process pool
+    @param configDict dict of config sections, as loaded by the main process
+    @param logLevel logging level
+    @return None
+"""
+def initWorker(configDict, logLevel):
+  lib.config.loadConfig(configDict)
+  lib.textMetrics.initMetricsCache()
+  lib.fontPool.initFontPool()
+  lib.glyphAtlas.initGlyphAtlas()
+  lib.layoutPlan.initPlanCache()
+  lib.songCache.initSongCache()
+  # Log records are sent back to the main process instead
+  logging.root.handlers = []
   logging.root.setLevel(logLevel)
-  logging.debug('Starting')
 
+"""!@brief Processes a single song inside of a worker process
+    @param filePath path to the input file
+    @param indexSong if set, also returns the fields of the parsed song for the song index
+    @return tuple of (list of written files or None if it failed, list of log records of this song,
+            lib.songIndex.SongEntry object or None if not requested or the song was not parsed)
+"""
+def processSongFile(filePath, indexSong):
+  handler = SongLogHandler()
+  logging.root.addHandler(handler)
+  entry = None
+  try:
+    song = lib.initSongs.initSong(filePath)
+    writtenFiles = tryProcessSong(song)
+    if indexSong and song.isParsed:
+      entry = lib.songIndex.createSongEntry(song)
+  finally:
+    logging.root.removeHandler(handler)
+  return writtenFiles, handler.records, entry
+
+"""!@brief Processes all songs using a pool of worker processes
+    Songs are handed to the workers as soon as they are found
+    The log records of each song are written out together once the song is done
+    @param songs iterable of lib.dataStructures.Song objects
+    @param jobs amount of worker processes
+    @param buildState lib.buildManifest.BuildState object, or None if not building incrementally
+    @param songIndex lib.songIndex.SongIndex object, or None if not keeping a song index
+    @param pendingVersions dict of input file -> (modification time, size) of songs which need to be indexed
+    @return tuple of (amount of songs which failed or were skipped, amount of processed songs)
+"""
+def processSongsInParallel(songs, jobs, buildState, songIndex, pendingVersions):
+  failures = 0
+  configDict = {section: dict(lib.config.config[section]) for section in lib.config.config.sections()}
+  with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, initializer=initWorker, initargs=(configDict, logging.root.level)) as executor:
+    futures = {executor.submit(processSongFile, song.inputFile, song.inputFile in pendingVersions): song for song in songs}
+    for future in concurrent.futures.as_completed(futures):
+      song = futures[future]
+      try:
+        writtenFiles, records, entry = future.result()
+      except Exception:
+        logging.exception("Worker failed while processing song '{}'".format(song.title))
+        writtenFiles, records, entry = None, [], None
+      for record in records:
+        logging.getLogger(record.name).handle(record)
+      if songIndex:
+        indexProcessedSong(songIndex, pendingVersions, song.inputFile, entry)
+      if buildState:
+        buildState.record(song.inputFile, writtenFiles)
+      if writtenFiles is None:
+        failures += 1
+  return failures, len(futures)
+
+"""!@brief Finds the songs which changed since they were indexed, passing all songs on unchanged
+    The changed songs are indexed once they have been parsed by the pipeline
+    Once all songs have been found, songs which no longer exist are removed from the index
+    @param songs iterable of lib.dataStructures.Song objects
+    @param songIndex lib.songIndex.SongIndex object
+    @param pendingVersions dict to which input file -> (modification time, size) of each changed song gets added
+    @return generator of lib.dataStructures.Song objects
+"""
+def findSongsToIndex(songs, songIndex, pendingVersions):
+  foundFiles = set()
   for song in songs:
-    logging.info("Found song '{}' at '{}'".format(song.title, song.inputFile))
+    foundFiles.add(song.inputFile)
+    try:
+      inputStat = os.stat(song.inputFile)
+      if songIndex.needsUpdate(song.inputFile, inputStat.st_mtime_ns, inputStat.st_size):
+        pendingVersions[song.inputFile] = (inputStat.st_mtime_ns, inputStat.st_size)
+    except Exception:
+      logging.exception("Failed to index song '{}'".format(song.title))
+    yield song
+  removedSongs = songIndex.removeMissing(foundFiles)
+  songIndex.commit()
+  logging.info("Removed {} missing songs from the song index".format(removedSongs))
 
-  # Convert all songs into sections
+"""!@brief Adds a song which was processed by the pipeline to the song index, if it needs to be indexed
+    @param songIndex lib.songIndex.SongIndex object
+    @param pendingVersions dict of input file -> (modification time, size) of songs which need to be indexed
+    @param inputFile path to the input file
+    @param entry lib.songIndex.SongEntry object of the parsed song, or None if it could not be parsed
+    @return None
+"""
+def indexProcessedSong(songIndex, pendingVersions, inputFile, entry):
+  version = pendingVersions.pop(inputFile, None)
+  if version is not None and entry is not None:
+    songIndex.updateEntry(entry, *version)
+
+"""!@brief Indexes the changed songs which were not processed, because they did not change since the last build
+    @param songIndex lib.songIndex.SongIndex object
+    @param pendingVersions dict of input file -> (modification time, size) of songs which still need to be indexed
+    @return None
+"""
+def indexSkippedSongs(songIndex, pendingVersions):
+  for inputFile, (mtime, size) in pendingVersions.items():
+    song = lib.initSongs.initSong(inputFile)
+    try:
+      if parseSong(song):
+        songIndex.update(song, mtime, size)
+    except Exception:
+      logging.exception("Failed to index song '{}'".format(song.title))
+  if pendingVersions:
+    logging.info("Indexed {} songs which did not need to be rebuilt".format(len(pendingVersions)))
+  pendingVersions.clear()
+
+"""!@brief Prints the songs found by a query of the song index
+    @param songs list of lib.songIndex.IndexedSong objects
+    @return None
+"""
+def printIndexedSongs(songs):
   for song in songs:
-    logging.info("Start parsing song '{}'...".format(song.title)) 
-    # Initialise internal data structures
-    logging.debug("song file extension {}".format(song.fileExtension))
-    if song.fileExtension == 'txt':
-      song.initSections()
-    elif song.fileExtension == 'rawtxt':
-      song.initPreprocessed()
-    else:
-      logging.warning("File extension '{}' not supported. Skipping...".format(song.fileExtension))
+    print("{}\t{}".format(song.title, song.path))
+
+"""!@brief Returns the modification time of a file
+    @param filePath path to the file
+    @return modification time in nanoseconds, or None if the file is gone
+"""
+def getModificationTime(filePath):
+  try:
+    return os.stat(filePath).st_mtime_ns
+  except OSError:
+    return None
+
+"""!@brief Yields the songs which need to be processed, as soon as they are found
+    @param songs iterable of lib.dataStructures.Song objects
+    @param foundSongs list to which every found song gets appended, including skipped songs
+    @param foundVersions dict to which input file -> modification time gets added for every found song,
+           taken before the song gets processed
+    @param buildState lib.buildManifest.BuildState object, or None if not building incrementally
+    @param force if set, also yield songs which did not change since the last build
+    @return generator of lib.dataStructures.Song objects
+"""
+def selectSongs(songs, foundSongs, foundVersions, buildState, force):
+  skippedSongs = 0
+  for song in songs:
+    logging.info("Found song '{}' at '{}'".format(song.title, song.inputFile))
+    foundSongs.append(song)
+    foundVersions[song.inputFile] = getModificationTime(song.inputFile)
+    # Skip songs which did not change since the last build
+    if buildState and not (buildState.needsBuild(song.inputFile) or force):
+      skippedSongs += 1
       continue
-    # If input is .raw output. If output to raw is set, overwrite itself
-    # ready quickly using rules
-    if not song.isParsed:
-      logging.error("Song was not initialized correctly. Skipping...")
+    yield song
+  if buildState:
+    logging.info("Skipped {} songs which did not change since the last build".format(skippedSongs))
+
+"""!@brief Writes all songs to a single PDF, in the order of their input files
+    Songs which were not planned by this process, because they were skipped or
+    processed by a worker process, are parsed and planned again
+    @param songs list of lib.dataStructures.Song objects
+    @param outputLocation path to the PDF file
+    @return None
+"""
+def writeCombinedPdf(songs, outputLocation):
+  laidOutSongs = []
+  for song in sorted(songs, key=lambda song: song.inputFile):
+    try:
+      if song.layoutPlan is None:
+        if not parseSong(song):
+          continue
+        planSong(song)
+    except Exception:
+      logging.exception("Failed to lay out song '{}' for the combined PDF".format(song.title))
       continue
+    laidOutSongs.append(song)
+  writtenSongs = output2pdf.outputCombinedPdf(outputLocation, laidOutSongs)
+  logging.info("Wrote {} out of {} songs to '{}'".format(writtenSongs, len(songs), outputLocation))
+
+"""!@brief Writes the text of all songs to a single bulk export file, in the order of their input files
+    Songs which were not parsed by this process, because they were skipped or
+    processed by a worker process, are parsed again
+    @param songs list of lib.dataStructures.Song objects
+    @param outputLocation path to the bulk export file
+    @param printRaw if set, uses the raw format for the text of each song
+    @return None
+"""
+def writeBulkTxt(songs, outputLocation, printRaw):
+  def iterateParsedSongs():
+    for song in sorted(songs, key=lambda song: song.inputFile):
+      try:
+        if not song.isParsed and not parseSong(song):
+          continue
+      except Exception:
+        logging.exception("Failed to parse song '{}' for the bulk export".format(song.title))
+        continue
+      yield song
+  writtenSongs = output2txt.outputBulkTxt(outputLocation, printRaw, iterateParsedSongs())
+  logging.info("Wrote {} out of {} songs to '{}'".format(writtenSongs, len(songs), outputLocation))
+
+"""!@brief Writes the combined PDF and the bulk export file of all songs, if they are enabled
+    @param songs list of lib.dataStructures.Song objects
+    @return None
+"""
+def writeCombinedOutputs(songs):
+  configObj = lib.config.config['options']
+  combinedPdf = configObj['combinedpdf'].strip()
+  if combinedPdf:
+    writeCombinedPdf(songs, combinedPdf)
+  bulkTxt = configObj['bulktxt'].strip()
+  if bulkTxt:
+    writeBulkTxt(songs, bulkTxt, configObj['bulktxtraw'] == '1')
 
-    if exportToTxt:
-      # Create subdirectory where we will output our images
-      targetDirectory = song.outputLocation + "-txt"
-      logging.info("Successfully parsed file. Writing output to '{}'\n".format(targetDirectory)) 
-      # Write out metadata and sections, as many as can fit on one page
-      output2txt.outputToTxt(targetDirectory, False, song)
-    if exportToRaw:
-      # Create subdirectory where we will output our images
-      targetDirectory = song.outputLocation + "-txt"
-      logging.info("Successfully parsed file. Writing output to '{}'\n".format(targetDirectory)) 
-      # Write out metadata and sections, as many as can fit on one page
-      output2txt.outputToTxt(targetDirectory, True, song)
-    if exportToImg:
-      # Fit all sections on each page, resizes down if it does not fit on width
-      song.fitSectionsByWidth()
-      # Prerender: calculate Pages, and move sections into Pages
-      song.sectionsToPages()
-      # Optimalisation: try to fill whitespace
-      while len(song.pages) > song.maxPages:
-        logging.debug("Resizing down since we have {} pages and want {} pages".format(len(song.pages), song.maxPages))
-        song.resizeAllSections(-1)
-        song.sectionsToPages()
-      while song.canFillWhitespace():
-        logging.debug("Resizing down to fill remaining vertical whitespace")
-        song.resizeAllSections(-1)
-        song.sectionsToPages()
-      # Optimalisation: increase font size to fit target page amount
-      song.increaseToMinPages()
-      # Parse as PNG a4
-      # Create subdirectory where we will output our images
-      targetDirectory = song.outputLocation + "-a4-png"
-      logging.info("Successfully parsed file. Writing output to '{}'\n".format(targetDirectory)) 
-      # Write out metadata and sections, as many as can fit on one page
-      output2img.outputToImage(targetDirectory, song)
+"""!@brief Keeps watching the input folders and rebuilds songs which were added or modified
+    Fonts, text measurements and the Song objects of all found songs stay in memory between builds
+    A modified file is parsed again into its existing Song object, a new file gets a new Song object
+    A change is only picked up once the file has not been modified for the debounce time,
+    so that a burst of saves results in a single rebuild
+    The combined PDF and the bulk export file are written again after each round of rebuilds
+    @param buildState lib.buildManifest.BuildState object, or None if not building incrementally
+    @param songIndex lib.songIndex.SongIndex object, or None if not keeping a song index
+    @param knownSongs list of lib.dataStructures.Song objects which were found by the first build
+    @param knownVersions dict of input file -> modification time of the songs found by the first build,
+           taken before they were built, so that files modified during the first build get rebuilt
+    @return None
+"""
+def watchSongs(buildState, songIndex, knownSongs, knownVersions):
+  configObj = lib.config.config['options']
+  interval = float(configObj['watchinterval'])
+  debounce = float(configObj['watchdebounce'])
+  # input file -> modification time of the version which was last built
+  # Files which appeared during the first build, like its own outputs, are taken as they are now
+  builtVersions = {filePath: getModificationTime(filePath) for filePath in lib.initSongs.getSongFiles()}
+  builtVersions.update(knownVersions)
+  # input file -> (modification time, time at which we first saw this modification time)
+  pendingVersions = {}
+  # input file -> Song object, kept between builds
+  songs = {song.inputFile: song for song in knownSongs}
+  logging.warning("Watching for changes every {} seconds. Press Ctrl+C to stop".format(interval))
+  while True:
+    time.sleep(interval)
+    now = time.monotonic()
+    foundFiles = lib.initSongs.getSongFiles()
+    # Set when the combined outputs need to be written again
+    isChanged = False
+    for filePath in set(builtVersions) - set(foundFiles):
+      logging.info("Song '{}' was removed".format(filePath))
+      builtVersions.pop(filePath)
+      songs.pop(filePath, None)
+      isChanged = True
+      if songIndex:
+        songIndex.remove(filePath)
+        songIndex.commit()
+    for filePath in foundFiles:
+      modificationTime = getModificationTime(filePath)
+      if modificationTime is None or builtVersions.get(filePath) == modificationTime:
+        pendingVersions.pop(filePath, None)
+        continue
+      # Restart the debounce timer whenever the file changes again
+      if filePath not in pendingVersions or pendingVersions[filePath][0] != modificationTime:
+        pendingVersions[filePath] = (modificationTime, now)
+        continue
+      if now - pendingVersions[filePath][1] < debounce:
+        continue
+      pendingVersions.pop(filePath)
+      builtVersions[filePath] = modificationTime
+      song = songs.get(filePath)
+      if song is None:
+        song = lib.initSongs.initSong(filePath)
+        songs[filePath] = song
+      else:
+        song.clearParseResults()
+      logging.warning("Rebuilding '{}'".format(filePath))
+      isChanged = True
+      if buildState:
+        buildState.needsBuild(filePath)
+      writtenFiles = tryProcessSong(song)
+      if buildState:
+        buildState.record(filePath, writtenFiles)
+        buildState.save()
+      if writtenFiles is None:
+        logging.error("Failed to rebuild '{}'".format(filePath))
+        continue
+      if songIndex and song.isParsed:
+        songIndex.update(song, modificationTime, os.stat(filePath).st_size)
+        songIndex.commit()
+    if isChanged:
+      writeCombinedOutputs(list(songs.values()))
+
+def main():
+  parser = argparse.ArgumentParser(description="Converts tablature source files to printable formats")
+  parser.add_argument('--jobs', type=int, default=None, help="amount of songs to process at the same time (0 uses all cores), overrides the 'jobs' option")
+  parser.add_argument('--force', action='store_true', help="rebuild all songs, even if they did not change since the last build")
+  parser.add_argument('--watch', action='store_true', help="keep running and rebuild songs when they are added or modified")
+  parser.add_argument('--find-title', metavar='TEXT', help="list the songs in the song index of which the title contains TEXT, instead of converting songs")
+  parser.add_argument('--find-lyrics', metavar='TEXT', help="list the songs in the song index of which the lyrics contain TEXT, instead of converting songs")
+  parser.add_argument('--find-chord', metavar='CHORD', help="list the songs in the song index which use CHORD, instead of converting songs")
+  args = parser.parse_args()
+  # Init config file
+  lib.config.initConfig()
+  lib.textMetrics.initMetricsCache()
+  lib.fontPool.initFontPool()
+  lib.glyphAtlas.initGlyphAtlas()
+  lib.layoutPlan.initPlanCache()
+  lib.songCache.initSongCache()
+  logging.basicConfig()
+  logging.root.setLevel(getLogLevel())
+  logging.debug('Starting')
+
+  jobs = args.jobs
+  if jobs is None:
+    jobs = int(lib.config.config['options']['jobs'])
+  if jobs < 1:
+    jobs = os.cpu_count() or 1
+  try:
+    lib.transpose.getTranspositions()
+  except ValueError as error:
+    logging.critical("Invalid 'transpose' option: {}".format(error))
+    return
+  colourMode = lib.config.config['output']['colourMode'].strip()
+  if colourMode not in lib.dataStructures.COLOUR_MODES:
+    logging.warning("Unknown colour mode '{}', expected one of {}. Falling back to 'auto'".format(colourMode, lib.dataStructures.COLOUR_MODES))
+
+  songIndex = None
+  songIndexPath = lib.config.config['options']['songindex'].strip()
+  if songIndexPath:
+    songIndex = lib.songIndex.SongIndex(songIndexPath)
+  if args.find_title is not None or args.find_lyrics is not None or args.find_chord is not None:
+    if songIndex is None:
+      logging.critical("Set the 'songIndex' option to search for songs")
+      return
+    if args.find_title is not None:
+      printIndexedSongs(songIndex.findByTitle(args.find_title))
+    if args.find_lyrics is not None:
+      printIndexedSongs(songIndex.findByLyrics(args.find_lyrics))
+    if args.find_chord is not None:
+      printIndexedSongs(songIndex.findByChord(args.find_chord))
+    songIndex.close()
+    return
+
+  buildState = None
+  if lib.config.config['options']['incrementalbuild'] == '1':
+    buildState = lib.buildManifest.BuildState()
+  # Init Song objects for all songs with compatible inputs, which flow into processing as they are found
+  allSongs = []
+  # input file -> modification time of every found song, before it was built
+  allVersions = {}
+  songs = lib.initSongs.iterateSongObjects()
+  # input file -> (modification time, size) of songs which changed since they were indexed
+  pendingVersions = {}
+  if songIndex:
+    songs = findSongsToIndex(songs, songIndex, pendingVersions)
+  songs = selectSongs(songs, allSongs, allVersions, buildState, args.force)
+
+  # Convert all songs into sections
+  try:
+    if jobs > 1:
+      failures, processedSongs = processSongsInParallel(songs, jobs, buildState, songIndex, pendingVersions)
+    else:
+      failures = 0
+      processedSongs = 0
+      for song in songs:
+        processedSongs += 1
+        writtenFiles = tryProcessSong(song)
+        if songIndex and song.inputFile in pendingVersions:
+          indexProcessedSong(songIndex, pendingVersions, song.inputFile, lib.songIndex.createSongEntry(song) if song.isParsed else None)
+        if buildState:
+          buildState.record(song.inputFile, writtenFiles)
+        if writtenFiles is None:
+          failures += 1
+  finally:
+    if buildState:
+      buildState.save()
+    if songIndex:
+      indexSkippedSongs(songIndex, pendingVersions)
+      songIndex.commit()
+  writeCombinedOutputs(allSongs)
+  lib.textMetrics.logStatistics()
+  lib.fontPool.logStatistics()
+  lib.glyphAtlas.logStatistics()
+  if failures:
+    logging.warning("Failed to process {} out of {} songs".format(failures, processedSongs))
+  if args.watch:
+    try:
+      watchSongs(buildState, songIndex, allSongs, allVersions)
+    except KeyboardInterrupt:
+      logging.info("Stopped watching for changes")
+  if songIndex:
+    songIndex.close()
 
 if __name__ == "__main__":
   main()
@@ -13,107 +13,111 @@
 #
 
 import os
+import concurrent.futures
 from PIL import Image, ImageDraw
 import logging
+import lib.config
+import lib.glyphAtlas
+import lib.layoutPlan
+
+"""!@brief Determines the image mode of the rendered pages
+    'auto' picks grayscale if all colours are shades of gray, since that renders the exact same pixels
+    Black and white is never picked automatically, since it drops the anti-aliasing of the text
+    @param songObj lib.dataStructures.Song object
+    @return 'RGB', 'L' or '1'
+"""
+def getImageMode(songObj):
+  if songObj.colourMode != 'auto':
+    return songObj.colourMode
+  colours = [songObj.fontColour, songObj.backgroundColour, songObj.metadataColour]
+  if all(len(set(colour[:3])) == 1 for colour in colours):
+    return 'L'
+  return 'RGB'
+
+"""!@brief Converts a configured RGB colour to a colour of the canvas
+    @param colour tuple of (red, green, blue)
+    @param canvasMode 'RGB' or 'L'
+    @return the colour itself for RGB canvases, else its luminance as PIL calculates it
+"""
+def getCanvasColour(colour, canvasMode):
+  if canvasMode == 'RGB':
+    return colour
+  return Image.new('RGB', (1, 1), colour).convert(canvasMode).getpixel((0, 0))
+
+"""!@brief Renders a single page of a layout plan
+    Black and white pages are drawn in grayscale first, then thresholded,
+    except for the metadata which gets dithered if 'ditherMetadata' is set
+    @param songObj lib.dataStructures.Song object containing the colours
+    @param plan lib.layoutPlan.LayoutPlan object
+    @param page lib.layoutPlan.PlannedPage object
+    @param imageMode 'RGB', 'L' or '1'
+    @return PIL.Image object of the page
+"""
+def renderPage(songObj, plan, page, imageMode='RGB'):
+  canvasMode = 'L' if imageMode == '1' else imageMode
+  # RGB colour -> colour of the canvas
+  canvasColours = {}
+
+  # New Image
+  a4image = Image.new(canvasMode,(plan.imageWidth, plan.imageHeight),getCanvasColour(songObj.backgroundColour, canvasMode))
+  draw = ImageDraw.Draw(a4image)
+
+  for x, y, text, font, colour in lib.layoutPlan.getTextRuns(plan, page, songObj):
+    if colour not in canvasColours:
+      canvasColours[colour] = getCanvasColour(colour, canvasMode)
+    lib.glyphAtlas.drawText(draw, (x, y), text, canvasColours[colour], font)
+  if imageMode != '1':
+    return a4image
+  bitmap = a4image.convert('1', dither=Image.Dither.NONE)
+  metadataBox = (0, 0, plan.imageWidth, page.metadataBottom)
+  if songObj.ditherMetadata and page.metadataBottom > 0:
+    bitmap.paste(a4image.crop(metadataBox).convert('1', dither=Image.Dither.FLOYDSTEINBERG), metadataBox)
+  return bitmap
+
+"""!@brief Renders a single page of a layout plan and writes it as PNG
+    @param songObj lib.dataStructures.Song object containing the colours
+    @param plan lib.layoutPlan.LayoutPlan object
+    @param page lib.layoutPlan.PlannedPage object
+    @param imageMode 'RGB', 'L' or '1'
+    @param outputLocation path to the PNG file
+    @return path to the PNG file
+"""
+def renderAndSavePage(songObj, plan, page, imageMode, outputLocation):
+  a4image = renderPage(songObj, plan, page, imageMode)
+  a4image.save(outputLocation, compress_level=songObj.pngCompressLevel)
+  return outputLocation
 
 """!@brief Exports the song object to images
-    This function renders the metadata and sections
-    of a given Song object, and exports it as PNG to the destination folder.
+    This function renders the layout plan of a given Song object,
+    and exports it as PNG to the destination folder.
     It will create the folder if it does not exist yet.
     It will overwrite existing images, but will not clear old images
+    Pages are rendered and compressed on a thread pool if 'pageRenderThreads' is above 1
     @param folderLocation path to where we want the images
     @param songObj lib.dataStructures.Song object
-    @return None
+    @return list of paths to the images which were written
 """
 def outputToImage(folderLocation, songObj):
   # Create target Directory if doesn't exist
   if not os.path.exists(folderLocation):
     os.mkdir(folderLocation)
-    logging.info("Directory {} Created ".format(folderLocation))
+    logging.info("Directory %s Created ", folderLocation)
   else:    
-    logging.debug("Directory {} already exists".format(folderLocation))
-      
-  # Init image info
-  imageNumber = 1
-  currentHeight = songObj.verticalMargin
-
-  # New Image
-  a4image = Image.new('RGB',(songObj.imageWidth, songObj.imageHeight),(songObj.backgroundColour))
-  draw = ImageDraw.Draw(a4image)
+    logging.debug("Directory %s already exists", folderLocation)
 
-  # Add extra whitespace on the left if this is an even page
-  # The whitespace on the right for uneven pages is handled elsewhere, by limiting the maximum horizontal size
-  horizontalMargin = songObj.horizontalMargin
-  if (imageNumber % 2) == 0:
-    horizontalMargin += songObj.extraHorizontalMargin
-  
-  # Write metadata
-  for line in songObj.metadata.split('\n'):
-    # remove any unwanted characters from metadata
-    line = line.rstrip()
-    if not line and not songObj.keepEmptyLines:
-      continue
-    logging.debug("Metadata '{}'".format(line))
-    metadataTextWidth, metadataTextHeight = songObj.fontMetadata.getsize(line)
-    draw.text((horizontalMargin, currentHeight), line, fill=songObj.metadataColour, font=songObj.fontMetadata)
-    currentHeight += metadataTextHeight
-  # Draw all pages
-  for page in songObj.pages:
-    # Margin between metadata and the first section / section and top of page
-    currentHeight += songObj.verticalMargin
-    for section in page.sections:
-      # Reset section specific variables
-      lineIterator = 0
-      amountOfLines = len(section.lyrics)
-      if (amountOfLines != len(section.tablatures)):
-        logging.critical("Cannot write this section to file, since it was not processed correctly. There are {} tablature lines and {} lyric lines. Aborting...".format(len(section.chords), amountOfLines))
-        return
-      if (section.expectedHeight == -1 or section.expectedWidth == -1):
-        logging.critical("Cannot write this section to file, since it was not processed correctly. The expected dimensions are not set. Aborting...")
-        return
-      # write section title
-      headerWidth, headerHeight = songObj.fontTablature.getsize(section.header)
-      draw.text((horizontalMargin ,currentHeight), section.header, fill=songObj.fontColour, font=songObj.fontTablature)
-      currentHeight += headerHeight
-      # Write each line tablature&lyric data
-      while lineIterator < amountOfLines:
-        logging.debug("Printing tablatures line {} and lyrics line {}".format(section.tablatures[lineIterator], section.lyrics[lineIterator]))
-        # Get tablatures&lyric line
-        lyricTextWidth, lyricTextHeight = songObj.fontLyrics.getsize(section.lyrics[lineIterator])
-        tablatureTextWidth, tablatureTextHeight = songObj.fontTablature.getsize(section.tablatures[lineIterator])
-        # add to image file
-        draw.text((horizontalMargin ,currentHeight), section.tablatures[lineIterator], fill=songObj.fontColour,  font=songObj.fontTablature)
-        currentHeight += tablatureTextHeight
-        draw.text((horizontalMargin ,currentHeight), section.lyrics[lineIterator], fill=songObj.fontColour, font=songObj.fontLyrics)
-        currentHeight += lyricTextHeight
-        lineIterator += 1
-        logging.debug("currentheight={}".format(currentHeight))
-      # If we stripped al whitespace, we need to add whitespace between sections
-      if not songObj.keepEmptyLines:
-        currentHeight += songObj.verticalMargin
-    # Got all sections in the page, so write it
-    outputLocation = folderLocation + "/" + songObj.title + '-' + str(imageNumber) + ".png"
-    a4image.save(outputLocation)
-    a4image = Image.new('RGB',(songObj.imageWidth, songObj.imageHeight),(songObj.backgroundColour))
-    draw = ImageDraw.Draw(a4image)
-    currentHeight = songObj.verticalMargin
-    imageNumber += 1
-    # Add extra whitespace on the left if this is an even page
-    # The whitespace on the right for uneven pages is handled elsewhere, by limiting the maximum horizontal size
-    horizontalMargin = songObj.horizontalMargin
-    if (imageNumber % 2) == 0:
-      horizontalMargin += songObj.extraHorizontalMargin
-    
-  
-  
-  
-  
-  
-  
-  
-  
-  
-  
-  
-  
-  
+  plan = songObj.layoutPlan
+  if plan is None:
+    logging.critical("Cannot write song '%s' to file, since it has not been laid out. Aborting...", songObj.title)
+    return []
+  imageMode = getImageMode(songObj)
+  logging.debug("Rendering pages in image mode '%s'", imageMode)
+  # Each page is written to <title>-<page number>.png
+  pageJobs = []
+  for page in plan.pages:
+    outputLocation = folderLocation + "/" + songObj.title + '-' + str(page.number) + ".png"
+    pageJobs.append((songObj, plan, page, imageMode, outputLocation))
+  threads = min(int(lib.config.config['options']['pagerenderthreads']), len(pageJobs))
+  if threads > 1:
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+      return list(executor.map(lambda job: renderAndSavePage(*job), pageJobs))
+  return [renderAndSavePage(*job) for job in pageJobs]
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+##
+# @file output2pdf.py
+#
+# @brief This program converts the internal data structure to a PDF file
+#
+# @section description Description
+# Writes all pages of a song to a single multi-page PDF, using the same pages as the PNG output
+# Pages are written one at a time, so at most one rasterized page is in memory
+# Songs can also be appended to a combined PDF containing all songs
+#
+# @section notes Notes
+# - Text is embedded using the TrueType fonts of the song if 'pdfEmbedFonts' is set,
+#   otherwise or if a font can not be embedded, each page is embedded as an image
+#
+
+import os
+import logging
+import lib.layoutPlan
+import lib.pdfWriter
+import output2img
+
+"""!@brief Checks whether the text of a layout plan can be written with embedded fonts
+    @param songObj lib.dataStructures.Song object
+    @param plan lib.layoutPlan.LayoutPlan object
+    @return True if text should be embedded, False if pages should be rasterized
+"""
+def canEmbedText(songObj, plan):
+  if not songObj.pdfEmbedFonts:
+    return False
+  for role, fontPath, fontSize in plan.fonts:
+    if not lib.pdfWriter.canEmbedFont(fontPath):
+      logging.info("Font '%s' can not be embedded in a PDF, rasterizing pages instead", fontPath)
+      return False
+  return True
+
+"""!@brief Appends all pages of the layout plan of the song object to a PDF
+    @param pdfWriter lib.pdfWriter.PdfWriter object
+    @param songObj lib.dataStructures.Song object
+    @return None
+"""
+def writeSongPages(pdfWriter, songObj):
+  plan = songObj.layoutPlan
+  embedText = canEmbedText(songObj, plan)
+  imageMode = output2img.getImageMode(songObj)
+  for page in plan.pages:
+    if embedText:
+      pdfWriter.addTextPage(plan.imageWidth, plan.imageHeight, songObj.backgroundColour, lib.layoutPlan.getTextRuns(plan, page, songObj))
+    else:
+      pdfWriter.addImagePage(output2img.renderPage(songObj, plan, page, imageMode))
+
+"""!@brief Exports the song object to a PDF file
+    It will create the folder if it does not exist yet.
+    It will overwrite an existing PDF
+    @param folderLocation path to where we want the PDF
+    @param songObj lib.dataStructures.Song object
+    @return list of paths to the files which were written
+"""
+def outputToPdf(folderLocation, songObj):
+  # Create target Directory if doesn't exist
+  if not os.path.exists(folderLocation):
+    os.mkdir(folderLocation)
+    logging.info("Directory %s Created ", folderLocation)
+  else:
+    logging.debug("Directory %s already exists", folderLocation)
+
+  if songObj.layoutPlan is None:
+    logging.critical("Cannot write song '%s' to file, since it has not been laid out. Aborting...", songObj.title)
+    return []
+  outputLocation = folderLocation + "/" + songObj.title + ".pdf"
+  pdfWriter = lib.pdfWriter.PdfWriter(outputLocation, songObj.layoutPlan.ppi, songObj.pngCompressLevel)
+  try:
+    writeSongPages(pdfWriter, songObj)
+  except Exception:
+    pdfWriter.abort()
+    raise
+  pdfWriter.close()
+  return [outputLocation]
+
+"""!@brief Exports song objects to a single PDF file, in the given order
+    Songs without a layout plan are left out
+    @param outputLocation path to the PDF file
+    @param songs list of lib.dataStructures.Song objects, which have a layout plan
+    @return amount of songs which were written
+"""
+def outputCombinedPdf(outputLocation, songs):
+  songs = [songObj for songObj in songs if songObj.layoutPlan is not None]
+  if not songs:
+    return 0
+  pdfWriter = lib.pdfWriter.PdfWriter(outputLocation, songs[0].layoutPlan.ppi, songs[0].pngCompressLevel)
+  writtenSongs = 0
+  try:
+    for songObj in songs:
+      writeSongPages(pdfWriter, songObj)
+      writtenSongs += 1
+  except Exception:
+    pdfWriter.abort()
+    raise
+  pdfWriter.close()
+  return writtenSongs
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+##
+# @file output2svg.py
+#
+# @brief This program converts the internal data structure to SVG files
+#
+# @section description Description
+# Generates an SVG image for each page, using the same layout as the PNG output
+# Each line becomes a text element at the position where it would be drawn,
+# so pages are small, resolution independent and render without rasterizing
+#
+# @section notes Notes
+# - Fonts are linked relative to the output folder, unless 'svgEmbedFonts' is set
+#   in which case the font files are embedded in each SVG
+#
+
+import os
+import base64
+import logging
+from xml.sax.saxutils import escape
+import lib.fontPool
+import lib.layoutPlan
+
+# Characters which are not allowed in XML documents
+XML_INVALID_CHARACTERS = dict.fromkeys(code for code in range(32) if chr(code) not in '\t\n\r')
+
+"""!@brief Converts an RGB colour to an SVG colour
+    @param colour tuple of (red, green, blue)
+    @return hex colour string
+"""
+def toSvgColour(colour):
+  return '#{:02x}{:02x}{:02x}'.format(*colour[:3])
+
+"""!@brief Returns the family name used for a font file in the SVG
+    Each font file gets its own family, so that bold and regular fonts can not get mixed up
+    @param fontPath path to the font file
+    @return font family name
+"""
+def getFontFamily(fontPath):
+  return os.path.splitext(os.path.basename(fontPath))[0]
+
+"""!@brief Creates the @font-face rules of the fonts used by the layout plan
+    @param folderLocation path to the folder containing the SVG files
+    @param songObj lib.dataStructures.Song object
+    @param plan lib.layoutPlan.LayoutPlan object
+    @return string containing the style sheet
+"""
+def getFontFaces(folderLocation, songObj, plan):
+  fontFaces = []
+  for fontPath in sorted(set(fontPath for role, fontPath, fontSize in plan.fonts)):
+    if songObj.svgEmbedFonts:
+      with open(fontPath, 'rb') as file:
+        source = "data:font/ttf;base64," + base64.b64encode(file.read()).decode('ascii')
+    else:
+      source = os.path.relpath(os.path.abspath(fontPath), os.path.abspath(folderLocation)).replace(os.sep, '/')
+    fontFaces.append('@font-face {{ font-family: "{}"; src: url("{}"); }}'.format(getFontFamily(fontPath), source))
+  return '\n'.join(fontFaces)
+
+"""!@brief Creates the SVG document of a single page of a layout plan
+    Text with the same font and colour shares a style class
+    @param songObj lib.dataStructures.Song object containing the colours
+    @param plan lib.layoutPlan.LayoutPlan object
+    @param page lib.layoutPlan.PlannedPage object
+    @param fontFaces string containing the @font-face rules
+    @return string containing the SVG document
+"""
+def renderPage(songObj, plan, page, fontFaces):
+  width = plan.imageWidth
+  height = plan.imageHeight
+  # (font path, font size, colour) -> class name
+  textClasses = {}
+  textLines = []
+  for x, y, text, font, colour in lib.layoutPlan.getTextRuns(plan, page, songObj):
+    text = text.rstrip().translate(XML_INVALID_CHARACTERS)
+    if not text:
+      continue
+    textClass = textClasses.setdefault((font.path, font.size, colour), 't' + str(len(textClasses)))
+    # PIL positions text by the top of its ascender, SVG by its baseline
+    with lib.fontPool.fontLock:
+      ascent, descent = font.getmetrics()
+    textLines.append('<text x="{}" y="{}" class="{}">{}</text>'.format(x, y + ascent, textClass, escape(text)))
+  styles = [fontFaces]
+  for (fontPath, fontSize, colour), textClass in textClasses.items():
+    styles.append('.{} {{ font-family: "{}", monospace; font-size: {}px; fill: {}; }}'.format(textClass, getFontFamily(fontPath), fontSize, toSvgColour(colour)))
+  lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+    '<svg xmlns="http://www.w3.org/2000/svg" xml:space="preserve" width="{:.3f}in" height="{:.3f}in" viewBox="0 0 {} {}">'.format(width / plan.ppi, height / plan.ppi, width, height),
+    '<style>', escape('\n'.join(styles)), '</style>',
+    '<rect width="{}" height="{}" fill="{}"/>'.format(width, height, toSvgColour(songObj.backgroundColour))]
+  lines += textLines
+  lines.append('</svg>')
+  return '\n'.join(lines) + '\n'
+
+"""!@brief Exports the song object to SVG images
+    It will create the folder if it does not exist yet.
+    It will overwrite existing images, but will not clear old images
+    @param folderLocation path to where we want the images
+    @param songObj lib.dataStructures.Song object
+    @return list of paths to the images which were written
+"""
+def outputToSvg(folderLocation, songObj):
+  # Create target Directory if doesn't exist
+  if not os.path.exists(folderLocation):
+    os.mkdir(folderLocation)
+    logging.info("Directory %s Created ", folderLocation)
+  else:
+    logging.debug("Directory %s already exists", folderLocation)
+
+  plan = songObj.layoutPlan
+  if plan is None:
+    logging.critical("Cannot write song '%s' to file, since it has not been laid out. Aborting...", songObj.title)
+    return []
+  fontFaces = getFontFaces(folderLocation, songObj, plan)
+  writtenFiles = []
+  # Each page is written to <title>-<page number>.svg
+  for page in plan.pages:
+    outputLocation = folderLocation + "/" + songObj.title + '-' + str(page.number) + ".svg"
+    with open(outputLocation, 'w', encoding='utf-8') as file:
+      file.write(renderPage(songObj, plan, page, fontFaces))
+    writtenFiles.append(outputLocation)
+  return writtenFiles
@@ -1,18 +1,28 @@
 #!/usr/bin/env python3
 ##
-# @file output2img.py
+# @file output2txt.py
 #
-# @brief This program converts the internal data structure to an image file
+# @brief This program converts the internal data structure to a text file
 #
 # @section description Description
-# Generates PNG images of a specific dimension (currently A4) of tablature data
-# Dynamically resizes specific sections to maximize using the entire paper (and avoid awkward page flips)
+# Generates a cleaned up text file of a song, in a readable or a raw format
+# The raw format keeps a tablature and lyric line for every line, so it can be read back without guessing
+# The index of each kind of line can be written to a JSON file next to it
+# Many songs can also be written to a single bulk export file, with one JSON object per song
+#
+# @section notes Notes
+# - The text of a song is collected in a list and written at once
 #
 
 import os
+import json
 import logging
+import lib.config
 
-"""!@brief Exports the song object to a txt file
+# Kinds of lines, in the order they are written to the JSON file
+LINE_KINDS = ['emptyLines', 'lyricLines', 'nonLyricLines', 'sectionHeaders', 'metadataLines']
+
+"""!@brief Converts the song object to text
           Perfect to use as source file for any program which requires
           tabs as input, due to the predictable layout of
           metadata
@@ -20,79 +30,81 @@ import logging
           <non-lyric line>
           <lyric line>
           ...
-    @param folderLocation path to where we want the text file
-    @param printRaw if set, prints empty lines as well and saves as .raw
+    @param printRaw if set, prints empty lines as well
             if false, will print in a more readable format
     @param songObj lib.dataStructures.Song object
-    @return None
+    @return tuple of (text, dict of line kind -> list of line indices), or None if a section was not processed correctly
 """
-def outputToTxt(folderLocation, printRaw, songObj):
-  # Create target Directory if doesn't exist
-  if not os.path.exists(folderLocation):
-    os.mkdir(folderLocation)
-    logging.info("Directory {} Created ".format(folderLocation))
-  else:    
-    logging.debug("Directory {} already exists".format(folderLocation))
-      
-  output = ""
-  emptyLines = []
-  lyricLines = []
-  nonLyricLines = []
-  sectionHeaders = []
-  metadataLines = []
+def createTxt(printRaw, songObj):
+  outputLines = []
+  lineIndices = {kind: [] for kind in LINE_KINDS}
+  emptyLines = lineIndices['emptyLines']
+  lyricLines = lineIndices['lyricLines']
+  nonLyricLines = lineIndices['nonLyricLines']
 
-  lineCounter = 0
   # Write metadata
   for line in songObj.metadata.splitlines(True):
     # remove any unwanted characters from metadata
     if not songObj.keepEmptyLines and not line:
       continue
-    logging.debug("Metadata '{}'".format(line))
-    output += line
-    metadataLines.append(lineCounter)
-    lineCounter += 1
-    
+    logging.log(lib.config.TRACE, "Metadata '%s'", line)
+    lineIndices['metadataLines'].append(len(outputLines))
+    outputLines.append(line)
+
   # If exporting raw, do not include the whitespace between metadata and sections
   # also do not add an extra whitespace if we already keep whitespaces from input
-  if not printRaw and not songObj.keepEmptyLines:
-    output += '\r\n'
-    emptyLines.append(lineCounter)
-    lineCounter += 1
+  addWhitespace = not printRaw and not songObj.keepEmptyLines
+  if addWhitespace:
+    emptyLines.append(len(outputLines))
+    outputLines.append('\r\n')
   # Draw all pages
   for section in songObj.sections:
-    lineIterator = 0
-    amountOfLines = len(section.lyrics)
-    if (amountOfLines != len(section.tablatures)):
-      logging.critical("Cannot write this section to file, since it was not processed correctly. There are {} tablature lines and {} lyric lines. Aborting...".format(len(section.chords), amountOfLines))
-      return
+    if (len(section.lyrics) != len(section.tablatures)):
+      logging.critical("Cannot write this section to file, since it was not processed correctly. There are %s tablature lines and %s lyric lines. Aborting...", len(section.tablatures), len(section.lyrics))
+      return None
     # write section title
-    output += section.header.rstrip() + '\r\n'
-    sectionHeaders.append(lineCounter)
-    lineCounter += 1
+    lineIndices['sectionHeaders'].append(len(outputLines))
+    outputLines.append(section.header.rstrip() + '\r\n')
     # Write each line tablature&lyric data
-    while lineIterator < amountOfLines:
-      tabline = section.tablatures[lineIterator].rstrip()
-      lyricline = section.lyrics[lineIterator].rstrip()
-      if printRaw or len(tabline):
-        output += tabline + '\r\n'
-        nonLyricLines.append(lineCounter)
-        lineCounter += 1
-      if printRaw or len(lyricline):
-        output += lyricline + '\r\n'
-        lyricLines.append(lineCounter)
-        lineCounter += 1
+    for tabline, lyricline in zip(section.tablatures, section.lyrics):
+      tabline = tabline.rstrip()
+      lyricline = lyricline.rstrip()
+      if printRaw or tabline:
+        nonLyricLines.append(len(outputLines))
+        outputLines.append(tabline + '\r\n')
+      if printRaw or lyricline:
+        lyricLines.append(len(outputLines))
+        outputLines.append(lyricline + '\r\n')
       #If both lines are empty, it is 1 emptyline
-      if not printRaw and not len(tabline) and not len(lyricline):
-        output += '\r\n'
-        emptyLines.append(lineCounter)
-        lineCounter += 1
-      lineIterator += 1
+      if not printRaw and not tabline and not lyricline:
+        emptyLines.append(len(outputLines))
+        outputLines.append('\r\n')
     # If exporting raw, do not include the whitespace between sections
     # also do not add an extra whitespace if we already keep whitespaces from input
-    if not printRaw and not songObj.keepEmptyLines:
-      output += '\r\n'
-      emptyLines.append(lineCounter)
-      lineCounter += 1
+    if addWhitespace:
+      emptyLines.append(len(outputLines))
+      outputLines.append('\r\n')
+  return ''.join(outputLines), lineIndices
+
+"""!@brief Exports the song object to a txt file
+    @param folderLocation path to where we want the text file
+    @param printRaw if set, prints empty lines as well and saves as .raw
+            if false, will print in a more readable format
+    @param songObj lib.dataStructures.Song object
+    @return list of paths to the files which were written
+"""
+def outputToTxt(folderLocation, printRaw, songObj):
+  # Create target Directory if doesn't exist
+  if not os.path.exists(folderLocation):
+    os.mkdir(folderLocation)
+    logging.info("Directory %s Created ", folderLocation)
+  else:
+    logging.debug("Directory %s already exists", folderLocation)
+
+  txt = createTxt(printRaw, songObj)
+  if txt is None:
+    return []
+  output, lineIndices = txt
   # Finished
   outputLocation = ""
   if not printRaw:
@@ -101,64 +113,31 @@ def outputToTxt(folderLocation, printRaw, songObj):
     outputLocation = folderLocation + "/"  + songObj.title + ".rawtxt"
   with open(outputLocation, "w") as fileOut:
     fileOut.write(output)
+  writtenFiles = [outputLocation]
   if songObj.writeMetadata:
-    if printRaw:
-      outputLocation = folderLocation + "/"  + songObj.title + ".rawtxt.json"
-    else:
-      outputLocation = folderLocation + "/"  + songObj.title + ".txt.json"
-
+    outputLocation += ".json"
     with open(outputLocation, "w") as fileOut:
-      fileOut.write('{\r\n')
-      fileOut.write('  "emptyLines": [')
-      hasNext = len(emptyLines)
-      for entry in emptyLines:
-        hasNext -= 1
-        fileOut.write(str(entry))
-        if hasNext:
-          fileOut.write(', ')
-      fileOut.write('],\r\n')
-      fileOut.write('  "lyricLines": [')
-      hasNext = len(lyricLines)
-      for entry in lyricLines:
-        hasNext -= 1
-        fileOut.write(str(entry))
-        if hasNext:
-          fileOut.write(', ')
-      fileOut.write('],\r\n')
-      fileOut.write('  "nonLyricLines": [')
-      hasNext = len(nonLyricLines)
-      for entry in nonLyricLines:
-        hasNext -= 1
-        fileOut.write(str(entry))
-        if hasNext:
-          fileOut.write(', ')
-      fileOut.write('],\r\n')
-      fileOut.write('  "sectionHeaders": [')
-      hasNext = len(sectionHeaders)
-      for entry in sectionHeaders:
-        hasNext -= 1
-        fileOut.write(str(entry))
-        if hasNext:
-          fileOut.write(', ')
-      fileOut.write('],\r\n')
-      fileOut.write('  "metadataLines": [')
-      hasNext = len(metadataLines)
-      for entry in metadataLines:
-        hasNext -= 1
-        fileOut.write(str(entry))
-        if hasNext:
-          fileOut.write(', ')
-      fileOut.write(']\r\n')
-      fileOut.write('}\r\n')
-  
-  
-  
-  
-  
-  
-  
-  
-  
-  
-  
-  
+      fileOut.write(json.dumps(lineIndices, separators=(',', ':')))
+    writtenFiles.append(outputLocation)
+  return writtenFiles
+
+"""!@brief Exports song objects to a single file, with one JSON object per line for each song
+    Each object contains the title, input file and text of the song, together with the index of each kind of line
+    @param outputLocation path to the bulk export file
+    @param printRaw if set, uses the raw format for the text of each song
+    @param songs iterable of parsed lib.dataStructures.Song objects
+    @return amount of songs which were written
+"""
+def outputBulkTxt(outputLocation, printRaw, songs):
+  writtenSongs = 0
+  with open(outputLocation, "w", encoding="utf-8") as fileOut:
+    for songObj in songs:
+      txt = createTxt(printRaw, songObj)
+      if txt is None:
+        continue
+      output, lineIndices = txt
+      entry = {'title': songObj.title, 'inputFile': songObj.inputFile, 'text': output}
+      entry.update(lineIndices)
+      fileOut.write(json.dumps(entry, separators=(',', ':')) + '\n')
+      writtenSongs += 1
+  return writtenSongs